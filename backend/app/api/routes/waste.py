@@ -3,28 +3,54 @@ Waste Identification API Routes
 Handles waste scanning, identification, and disposal guidance
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Request, Form
-from fastapi.responses import JSONResponse
-from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field, validator
+from fastapi import APIRouter, BackgroundTasks, File, UploadFile, HTTPException, Depends, Request, Form
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 from datetime import datetime
+import asyncio
+import bisect
+import copy
 import logging
+import uuid
 
+import orjson
+from cachetools import TTLCache
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-
-from app.core.config import settings
+from firebase_admin import firestore
+
+from app.core.config import (
+    settings,
+    LEVEL_THRESHOLD_VALUES,
+    LEVEL_THRESHOLD_LEVELS,
+    WASTE_CATEGORIES_SET,
+)
 from app.services.gemini_service import get_gemini_service
-from app.utils.image_processor import get_image_processor, validate_uploaded_file
-from app.core.database import get_firestore_client, FirestoreCollections
+from app.utils.image_processor import get_image_processor
+from app.core.database import (
+    get_firestore_client,
+    upsert_user_aggregate,
+    remove_scan_from_user_aggregate,
+    newest_recent_scans,
+    trim_recent_scans,
+    FirestoreCollections
+)
 
 logger = logging.getLogger(__name__)
 
-# Create router
-router = APIRouter()
+# Create router (orjson-backed responses)
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.REDIS_URL or "memory://",
+    strategy="moving-window"
+)
+
+# Identification results keyed by image content key (skips Gemini for repeat images)
+_SCAN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=24 * 60 * 60)
 
 
 # ==================== PYDANTIC MODELS ====================
@@ -48,11 +74,11 @@ class WasteScanResponse(BaseModel):
     processing_time_seconds: float
     timestamp: str
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "success": True,
-                "scan_id": "scan_20241204_abc123",
+                "scan_id": "scan_3f9a1c0b7d2e4a61",
                 "item_name": "Plastic Water Bottle",
                 "category": "Recyclable Plastic",
                 "confidence": 0.95,
@@ -74,19 +100,14 @@ class WasteScanResponse(BaseModel):
                 "timestamp": "2024-12-04T10:30:00Z"
             }
         }
+    )
 
 
 class WasteScanRequest(BaseModel):
     """Request model for waste scan with base64 image"""
-    image_base64: str = Field(..., description="Base64 encoded image")
+    image_base64: str = Field(..., min_length=100, description="Base64 encoded image")
     user_id: Optional[str] = Field(None, description="User ID for tracking")
     location: Optional[Dict[str, float]] = Field(None, description="GPS coordinates")
-    
-    @validator('image_base64')
-    def validate_base64(cls, v):
-        if not v or len(v) < 100:
-            raise ValueError("Invalid base64 image data")
-        return v
 
 
 class EducationalContentResponse(BaseModel):
@@ -112,28 +133,49 @@ class WasteCategoriesResponse(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
+def generate_scan_id() -> str:
+    """
+    Generate a unique scan document ID
+    
+    Random rather than time-based, so two scans from the same user in the
+    same second don't overwrite each other.
+    
+    Returns:
+        Scan document ID
+    """
+    return f"scan_{uuid.uuid4().hex[:16]}"
+
+
 async def save_scan_to_database(
     scan_data: Dict[str, Any],
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    scan_id: Optional[str] = None
 ) -> str:
     """
     Save scan result to Firestore
     
+    For signed-in users the scan document, the user stats update and the
+    user's denormalized recent_scans list are committed in one batched write.
+    
     Args:
         scan_data: Scan result data
         user_id: Optional user ID
+        scan_id: Pre-generated scan ID (generated if None)
         
     Returns:
         Scan document ID
     """
+    # Generate scan ID
+    scan_id = scan_id or generate_scan_id()
+    
+    # Reuse the timestamp returned to the client so history matches it
+    now_iso = scan_data.get("timestamp") or datetime.utcnow().isoformat()
+    
     try:
         db = get_firestore_client()
         if db is None:
             logger.warning("Firestore not available, skipping database save")
-            return "scan_" + datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        
-        # Generate scan ID
-        scan_id = f"scan_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{user_id or 'anonymous'}"
+            return scan_id
         
         # Prepare document
         document = {
@@ -144,73 +186,245 @@ async def save_scan_to_database(
             "confidence": scan_data.get("confidence"),
             "recyclable": scan_data.get("recyclable"),
             "points_earned": scan_data.get("points_earned", 0),
-            "timestamp": datetime.utcnow(). isoformat(),
+            "co2_saved_kg": scan_data.get("environmental_impact", {}).get("co2_saved_kg", 0.0),
+            "timestamp": now_iso,
             "processing_time": scan_data.get("processing_time_seconds"),
             "location": scan_data.get("location"),
             "image_hash": scan_data.get("image_hash")
         }
         
-        # Save to Firestore
-        db.collection(FirestoreCollections.WASTE_SCANS). document(scan_id).set(document)
-        
-        # Update user stats if user_id provided
         if user_id:
-            await update_user_stats(user_id, scan_data)
+            # Scan + user stats + recent_scans in a single batched write
+            stats_update = _build_user_stats_update(user_id, scan_data, now_iso)
+            if not await upsert_user_aggregate(user_id, document, stats_update):
+                logger.error(f"❌ Failed to save scan to database: {scan_id}")
+                return scan_id
+        else:
+            # Save to Firestore (blocking client call, keep it off the event loop)
+            scan_ref = db.collection(FirestoreCollections.WASTE_SCANS).document(scan_id)
+            await asyncio.to_thread(scan_ref.set, document)
         
         logger.info(f"✅ Scan saved to database: {scan_id}")
         return scan_id
         
     except Exception as e:
         logger.error(f"❌ Failed to save scan to database: {str(e)}")
-        return "scan_" + datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        return scan_id
 
 
-async def update_user_stats(user_id: str, scan_data: Dict[str, Any]):
+def _build_user_stats_update(
+    user_id: str,
+    scan_data: Dict[str, Any],
+    now_iso: str
+) -> Dict[str, Any]:
     """
-    Update user statistics after scan
+    Build a merge payload that increments user statistics for one scan
+    
+    Counters use Firestore Increment transforms, so the payload can be
+    written without reading the user document first.
     
     Args:
         user_id: User ID
         scan_data: Scan result data
+        now_iso: Current UTC time as ISO string
+        
+    Returns:
+        Document fields for ``set(..., merge=True)``
     """
-    try:
-        db = get_firestore_client()
-        if db is None:
-            return
+    return {
+        "user_id": user_id,
+        "total_scans": firestore.Increment(1),
+        "total_points": firestore.Increment(scan_data.get("points_earned", 0)),
+        "co2_saved_kg": firestore.Increment(
+            scan_data.get("environmental_impact", {}).get("co2_saved_kg", 0.0)
+        ),
+        "last_scan_timestamp": now_iso,
+        "updated_at": now_iso
+    }
+
+
+async def identify_processed_image(processed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Identify waste in a processed image, reusing cached results
+    
+    Args:
+        processed: Result of ImageProcessor.process_image
         
-        user_ref = db.collection(FirestoreCollections.USERS).document(user_id)
-        user_doc = user_ref.get()
+    Returns:
+        Waste identification result (a fresh copy, safe to mutate)
+    """
+    content_key = processed["content_key"]
+    
+    cached = _SCAN_CACHE.get(content_key)
+    if cached is not None:
+        logger.info(f"♻️ Scan cache hit: {content_key[:12]}")
+        return copy.deepcopy(cached)
+    
+    gemini_service = get_gemini_service()
+    result = await gemini_service.identify_waste(processed['optimized_data'])
+    
+    _cache_scan_result(content_key, result)
+    
+    return result
+
+
+def _cache_scan_result(content_key: str, result: Dict[str, Any]):
+    """
+    Remember an identification result for repeat images
+    Errors, fallback replies (raw_ai_response) and results that don't fit
+    WasteScanResponse are not cached, so one bad Gemini reply isn't pinned
+    to the image for the cache lifetime
+    
+    Args:
+        content_key: Image content key
+        result: Identification result (before per-request fields are added)
+    """
+    if result.get("error") or "raw_ai_response" in result or content_key in _SCAN_CACHE:
+        return
+    
+    try:
+        # timestamp is set per request, validate the rest of the shape
+        WasteScanResponse.model_validate({**result, "timestamp": ""})
+    except ValidationError:
+        return
+    
+    _SCAN_CACHE[content_key] = copy.deepcopy(result)
+
+
+async def _stream_scan_history(
+    scans: Iterator[Any],
+    first_scan: Optional[Any],
+    header: Dict[str, Any],
+    limit: int
+) -> AsyncIterator[bytes]:
+    """
+    Encode a scan history page as JSON while documents arrive from Firestore
+    
+    Args:
+        scans: Firestore document stream (blocking iterator)
+        first_scan: First document, already fetched (None if empty)
+        header: Top-level response fields emitted before the scans
+        limit: Page size, used to decide whether there is a next page
         
-        if user_doc.exists:
-            # Update existing user
-            user_data = user_doc.to_dict()
+    Yields:
+        Chunks of the JSON response body
+    """
+    yield orjson.dumps(header)[:-1] + b',"scans":['
+    
+    count = 0
+    last_timestamp = None
+    scan = first_scan
+    
+    try:
+        while scan is not None:
+            scan_data = scan.to_dict()
+            scan_data["id"] = scan.id
+            last_timestamp = scan_data.get("timestamp")
             
-            # Increment counters
-            user_ref.update({
-                "total_scans": user_data. get("total_scans", 0) + 1,
-                "total_points": user_data.get("total_points", 0) + scan_data.get("points_earned", 0),
-                "co2_saved_kg": user_data.get("co2_saved_kg", 0.0) + scan_data.get("environmental_impact", {}).get("co2_saved_kg", 0.0),
-                "last_scan_timestamp": datetime.utcnow(). isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            })
+            yield (b"," if count else b"") + orjson.dumps(scan_data, default=str)
+            count += 1
             
-            logger.info(f"✅ Updated stats for user: {user_id}")
-        else:
-            # Create new user stats
-            user_ref.set({
-                "user_id": user_id,
-                "total_scans": 1,
-                "total_points": scan_data.get("points_earned", 0),
-                "co2_saved_kg": scan_data.get("environmental_impact", {}).get("co2_saved_kg", 0.0),
-                "level": 1,
-                "created_at": datetime.utcnow().isoformat(),
-                "last_scan_timestamp": datetime.utcnow().isoformat()
-            })
+            scan = await asyncio.to_thread(next, scans, None)
+    except Exception as e:
+        # The body is already partly sent, so the status can't change:
+        # flag the page as incomplete and keep the cursor so the client
+        # can resume instead of treating this as the end of its history
+        logger.error(f"❌ Scan history stream interrupted: {str(e)}")
+        yield (
+            b'],"count":' + orjson.dumps(count)
+            + b',"next_cursor":' + orjson.dumps(last_timestamp, default=str)
+            + b',"error":' + orjson.dumps(f"Scan history interrupted: {str(e)}") + b"}"
+        )
+        return
+    
+    next_cursor = last_timestamp if count == limit else None
+    yield b'],"count":' + orjson.dumps(count) + b',"next_cursor":' + orjson.dumps(next_cursor) + b"}"
+    
+    logger.info(f"✅ Retrieved {count} scans for user {header['user_id']}")
+
+
+async def _stream_scan_events(
+    processed: Dict[str, Any],
+    user_id: Optional[str],
+    background_tasks: BackgroundTasks
+) -> AsyncIterator[bytes]:
+    """
+    Encode identification progress as Server-Sent Events
+    
+    Args:
+        processed: Result of ImageProcessor.process_image
+        user_id: Optional user ID for tracking and points
+        background_tasks: Request background tasks (database save is queued here)
+        
+    Yields:
+        SSE frames ("partial", "result" or "error")
+    """
+    image_hash = processed["image_hash"]
+    content_key = processed["content_key"]
+    
+    cached = _SCAN_CACHE.get(content_key)
+    if cached is not None:
+        logger.info(f"♻️ Scan cache hit: {content_key[:12]}")
+        events = _single_event("result", copy.deepcopy(cached))
+    else:
+        events = get_gemini_service().identify_waste_stream(processed['optimized_data'])
+    
+    async for event in events:
+        data = event["data"]
+        
+        name = event["event"]
+        
+        if name == "result":
+            _cache_scan_result(content_key, data)
             
-            logger.info(f"✅ Created new user stats: {user_id}")
+            data["image_hash"] = image_hash
+            data["timestamp"] = datetime.utcnow().isoformat()
+            data["scan_id"] = generate_scan_id()
             
-    except Exception as e:
-        logger.error(f"❌ Failed to update user stats: {str(e)}")
+            try:
+                response = WasteScanResponse(**data).model_dump()
+            except Exception as e:
+                logger.error(f"❌ Streamed scan failed: {str(e)}", exc_info=True)
+                name, data = "error", {"error": True, "error_message": str(e)}
+            else:
+                # Save the full result (the response model has no image_hash);
+                # runs after the stream has been fully sent
+                background_tasks.add_task(save_scan_to_database, data, user_id, data["scan_id"])
+                logger.info(f"✅ Streamed scan completed: {data['item_name']}")
+                data = response
+        
+        yield b"event: " + name.encode() + b"\ndata: " + orjson.dumps(data, default=str) + b"\n\n"
+
+
+async def _single_event(event: str, data: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """Wrap one already-known result as an event stream"""
+    yield {"event": event, "data": data}
+
+
+def _bulk_delete_documents(query) -> int:
+    """
+    Delete every document matched by a query using a BulkWriter
+    
+    BulkWriter pipelines the deletes and retries throttled writes, which is
+    faster than issuing one delete() per document. Blocking - call it
+    through asyncio.to_thread from async code.
+    
+    Args:
+        query: Firestore query or collection reference
+        
+    Returns:
+        Number of documents deleted
+    """
+    db = get_firestore_client()
+    bulk = db.bulk_writer()
+    deleted = 0
+    
+    for doc in query.stream():
+        bulk.delete(doc.reference)
+        deleted += 1
+    
+    bulk.close()
+    return deleted
 
 
 # ==================== ROUTES ====================
@@ -219,6 +433,7 @@ async def update_user_stats(user_id: str, scan_data: Dict[str, Any]):
 @limiter.limit(f"{settings. RATE_LIMIT_SCAN_PER_HOUR}/hour")
 async def scan_waste_image(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(... , description="Image file to scan"),
     user_id: Optional[str] = Form(None, description="User ID for tracking")
 ):
@@ -246,27 +461,25 @@ async def scan_waste_image(
                 detail="Invalid file type. Please upload an image file (JPEG, PNG, WebP)"
             )
         
-        # Read file data
-        file_data = await file.read()
-        
-        if len(file_data) == 0:
+        if file.size == 0:
             raise HTTPException(status_code=400, detail="Empty file uploaded")
         
-        # Validate image
+        # Validate and process image in one pass (process_image validates
+        # internally). CPU-bound; run in a worker thread so other requests'
+        # Gemini calls keep progressing on the event loop meanwhile.
+        # The upload is already spooled to a temp file by the multipart
+        # parser, so hand PIL the file object rather than reading it into RAM
         image_processor = get_image_processor()
-        is_valid, error_message = validate_uploaded_file(file_data, file.filename)
         
-        if not is_valid:
-            raise HTTPException(status_code=400, detail=error_message)
-        
-        logger.info(f"✅ Image validated: {file.filename} ({len(file_data) / 1024:.1f} KB)")
+        try:
+            processed = await asyncio.to_thread(image_processor.process_image, file.file, file.filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Process image
-        processed = image_processor.process_image(file_data, file.filename)
+        logger.info(f"✅ Image validated: {file.filename} ({processed['metadata']['original_size'] / 1024:.1f} KB)")
         
         # Identify waste using Gemini
-        gemini_service = get_gemini_service()
-        result = await gemini_service.identify_waste(processed['optimized_data'])
+        result = await identify_processed_image(processed)
         
         # Check for errors
         if result.get("error"):
@@ -278,13 +491,13 @@ async def scan_waste_image(
         # Add image hash
         result["image_hash"] = processed["image_hash"]
         
-        # Save to database
-        scan_id = await save_scan_to_database(result, user_id)
-        result["scan_id"] = scan_id
-        
         # Add timestamp
         result["timestamp"] = datetime.utcnow().isoformat()
         
+        # Save to database after the response is sent
+        result["scan_id"] = generate_scan_id()
+        background_tasks.add_task(save_scan_to_database, result, user_id, result["scan_id"])
+        
         logger. info(f"✅ Scan completed: {result['item_name']} | Confidence: {result['confidence']:.1%} | Points: {result. get('points_earned', 0)}")
         
         return WasteScanResponse(**result)
@@ -303,6 +516,7 @@ async def scan_waste_image(
 @limiter.limit(f"{settings. RATE_LIMIT_SCAN_PER_HOUR}/hour")
 async def scan_waste_base64(
     request: Request,
+    background_tasks: BackgroundTasks,
     scan_request: WasteScanRequest
 ):
     """
@@ -328,18 +542,14 @@ async def scan_waste_base64(
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
         
-        # Validate image
-        is_valid, error_message = validate_uploaded_file(file_data, "scan. jpg")
-        
-        if not is_valid:
-            raise HTTPException(status_code=400, detail=error_message)
-        
-        # Process image
-        processed = image_processor. process_image(file_data, "scan.jpg")
+        # Validate and process image (CPU-bound; run in a worker thread)
+        try:
+            processed = await asyncio.to_thread(image_processor.process_image, file_data, "scan.jpg")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Identify waste
-        gemini_service = get_gemini_service()
-        result = await gemini_service.identify_waste(processed['optimized_data'])
+        result = await identify_processed_image(processed)
         
         if result.get("error"):
             raise HTTPException(status_code=500, detail=result.get('error_message'))
@@ -348,11 +558,12 @@ async def scan_waste_base64(
         result["image_hash"] = processed["image_hash"]
         result["location"] = scan_request.location
         
-        # Save to database
-        scan_id = await save_scan_to_database(result, scan_request.user_id)
-        result["scan_id"] = scan_id
         result["timestamp"] = datetime.utcnow().isoformat()
         
+        # Save to database after the response is sent
+        result["scan_id"] = generate_scan_id()
+        background_tasks.add_task(save_scan_to_database, result, scan_request.user_id, result["scan_id"])
+        
         logger.info(f"✅ Base64 scan completed: {result['item_name']}")
         
         return WasteScanResponse(**result)
@@ -364,6 +575,51 @@ async def scan_waste_base64(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/scan/stream")
+@limiter.limit(f"{settings. RATE_LIMIT_SCAN_PER_HOUR}/hour")
+async def scan_waste_image_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(... , description="Image file to scan"),
+    user_id: Optional[str] = Form(None, description="User ID for tracking")
+):
+    """
+    **Scan waste item with streamed results (Server-Sent Events)**
+    
+    Same input as /scan. Emits a `partial` event with `item_name` and
+    `category` as soon as Gemini has generated them, then a `result` event
+    with the full /scan response body (or an `error` event).
+    """
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid file type. Please upload an image file (JPEG, PNG, WebP)"
+        )
+    
+    if file.size == 0:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    
+    image_processor = get_image_processor()
+    
+    try:
+        processed = await asyncio.to_thread(image_processor.process_image, file.file, file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(
+        _stream_scan_events(processed, user_id, background_tasks),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # GZipMiddleware skips responses that already declare an
+            # encoding; it would otherwise hold events until the stream ends
+            "Content-Encoding": "identity",
+            # Tell reverse proxies (nginx) not to buffer the stream either
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.get("/categories", response_model=WasteCategoriesResponse)
 async def get_waste_categories():
     """
@@ -388,13 +644,13 @@ async def get_educational_content(category: str):
     """
     try:
         # Validate category
-        if category not in settings.WASTE_CATEGORIES:
+        if category not in WASTE_CATEGORIES_SET:
             raise HTTPException(
                 status_code=404,
                 detail=f"Category '{category}' not found. Use /categories to see valid categories."
             )
         
-        # Get educational content
+        # Get educational content (cached by the service)
         gemini_service = get_gemini_service()
         content = await gemini_service.get_educational_content(category)
         
@@ -416,7 +672,8 @@ async def get_scan_history(
     request: Request,
     user_id: str,
     limit: int = 20,
-    offset: int = 0
+    offset: int = 0,
+    after_timestamp: Optional[str] = None
 ):
     """
     **Get scan history for a user**
@@ -425,7 +682,10 @@ async def get_scan_history(
     
     - **user_id**: User ID
     - **limit**: Number of results to return (max 100)
-    - **offset**: Number of results to skip
+    - **offset**: Number of results to skip (prefer `after_timestamp`)
+    - **after_timestamp**: Cursor from a previous page's `next_cursor`
+    
+    The response body is streamed as documents are read from Firestore.
     """
     try:
         # Validate limit
@@ -443,29 +703,30 @@ async def get_scan_history(
         scans_ref = db.collection(FirestoreCollections.WASTE_SCANS) \
             .where("user_id", "==", user_id) \
             .order_by("timestamp", direction=firestore.Query.DESCENDING) \
-            .limit(limit) \
-            .offset(offset)
-        
-        scans = scans_ref.stream()
+            .limit(limit)
         
-        # Convert to list
-        scan_list = []
-        for scan in scans:
-            scan_data = scan.to_dict()
-            scan_data["id"] = scan. id
-            scan_list.append(scan_data)
+        # Cursor pagination is O(page); offset bills every skipped document
+        if after_timestamp:
+            scans_ref = scans_ref.start_after({"timestamp": after_timestamp})
+        elif offset:
+            scans_ref = scans_ref.offset(offset)
         
-        logger.info(f"✅ Retrieved {len(scan_list)} scans for user {user_id}")
+        # Fetch the first document up front so query errors still map to a 500
+        scans = scans_ref.stream()
+        first_scan = await asyncio.to_thread(next, scans, None)
         
-        return {
+        header = {
             "success": True,
             "user_id": user_id,
-            "scans": scan_list,
-            "count": len(scan_list),
             "limit": limit,
             "offset": offset
         }
         
+        return StreamingResponse(
+            _stream_scan_history(scans, first_scan, header, limit),
+            media_type="application/json"
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -474,11 +735,12 @@ async def get_scan_history(
 
 
 @router.get("/stats/{user_id}")
-async def get_user_stats(user_id: str):
+async def get_user_stats(user_id: str, background_tasks: BackgroundTasks):
     """
     **Get statistics for a user**
     
-    Returns scanning statistics and environmental impact for a user.
+    Returns scanning statistics and environmental impact for a user,
+    including their most recent scans.
     
     - **user_id**: User ID
     """
@@ -489,29 +751,29 @@ async def get_user_stats(user_id: str):
         
         # Get user stats
         user_ref = db.collection(FirestoreCollections.USERS).document(user_id)
-        user_doc = user_ref.get()
+        user_doc = await asyncio.to_thread(user_ref.get)
         
         if not user_doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
         
         stats = user_doc.to_dict()
         
+        # recent_scans only grows on write; serve the newest entries and
+        # trim the stored array after responding
+        recent_scans = stats.get("recent_scans", [])
+        stats["recent_scans"] = newest_recent_scans(recent_scans)
+        background_tasks.add_task(trim_recent_scans, user_id, recent_scans)
+        
         # Calculate level
         total_points = stats.get("total_points", 0)
-        level = 1
-        for lvl, threshold in sorted(settings.LEVEL_THRESHOLDS.items(), reverse=True):
-            if total_points >= threshold:
-                level = lvl
-                break
+        idx = max(bisect.bisect_right(LEVEL_THRESHOLD_VALUES, total_points) - 1, 0)
         
-        stats["level"] = level
+        stats["level"] = LEVEL_THRESHOLD_LEVELS[idx]
         stats["next_level_points"] = None
         
         # Find next level threshold
-        for lvl in sorted(settings.LEVEL_THRESHOLDS.keys()):
-            if lvl > level:
-                stats["next_level_points"] = settings.LEVEL_THRESHOLDS[lvl] - total_points
-                break
+        if idx + 1 < len(LEVEL_THRESHOLD_VALUES):
+            stats["next_level_points"] = LEVEL_THRESHOLD_VALUES[idx + 1] - total_points
         
         return {
             "success": True,
@@ -543,7 +805,7 @@ async def delete_scan(scan_id: str, user_id: str):
         
         # Get scan document
         scan_ref = db. collection(FirestoreCollections. WASTE_SCANS). document(scan_id)
-        scan_doc = scan_ref.get()
+        scan_doc = await asyncio.to_thread(scan_ref.get)
         
         if not scan_doc.exists:
             raise HTTPException(status_code=404, detail="Scan not found")
@@ -554,8 +816,13 @@ async def delete_scan(scan_id: str, user_id: str):
         if scan_data.get("user_id") != user_id:
             raise HTTPException(status_code=403, detail="Not authorized to delete this scan")
         
-        # Delete
-        scan_ref.delete()
+        # Delete (and undo the scan's effect on the user's stats and
+        # recent_scans; anonymous scans have no user document)
+        if user_id != "anonymous":
+            if not await remove_scan_from_user_aggregate(user_id, {**scan_data, "scan_id": scan_id}):
+                raise HTTPException(status_code=500, detail="Failed to delete scan")
+        else:
+            await asyncio.to_thread(scan_ref.delete)
         
         logger.info(f"✅ Deleted scan: {scan_id}")
         
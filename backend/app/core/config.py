@@ -5,8 +5,8 @@ Handles all environment variables and app settings
 
 from functools import lru_cache
 from typing import Optional, List
-from pydantic_settings import BaseSettings
-from pydantic import Field, validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import Field, field_validator
 import os
 from pathlib import Path
 
@@ -25,6 +25,9 @@ class Settings(BaseSettings):
     APP_DESCRIPTION: str = "AI-Powered Waste Sorting Assistant"
     DEBUG: bool = Field(default=False, env="DEBUG")
     ENVIRONMENT: str = Field(default="development", env="ENVIRONMENT")
+    # API worker processes for `python -m app.main` (each also runs its own
+    # image process pools, sized to share the CPUs between workers)
+    WEB_CONCURRENCY: int = Field(default=1, ge=1, env="WEB_CONCURRENCY")
     
     # ==================== API CONFIGURATION ====================
     API_V1_PREFIX: str = "/api/v1"
@@ -44,7 +47,8 @@ class Settings(BaseSettings):
     env="BACKEND_CORS_ORIGINS"
     )
     
-    @validator("BACKEND_CORS_ORIGINS", pre=True)
+    @field_validator("BACKEND_CORS_ORIGINS", mode="before")
+    @classmethod
     def assemble_cors_origins(cls, v):
         if isinstance(v, str):
             return [i.strip() for i in v. split(",")]
@@ -56,7 +60,17 @@ class Settings(BaseSettings):
         default="gemini-2.5-flash",
         env="GEMINI_MODEL"
     )
+    # Cheaper model tried first; low-confidence results are re-run on
+    # GEMINI_MODEL (leave empty to always use GEMINI_MODEL)
+    GEMINI_FAST_MODEL: Optional[str] = Field(
+        default="gemini-2.5-flash-lite",
+        env="GEMINI_FAST_MODEL"
+    )
     GEMINI_TEMPERATURE: float = Field(default=0.4, env="GEMINI_TEMPERATURE")
+    # Opt-in: scans arriving within the window under load are sent to
+    # Gemini as one multi-image request (batch size 1 disables batching)
+    GEMINI_BATCH_MAX_SIZE: int = Field(default=1, ge=1, env="GEMINI_BATCH_MAX_SIZE")
+    GEMINI_BATCH_WINDOW_MS: int = Field(default=20, ge=0, env="GEMINI_BATCH_WINDOW_MS")
     GEMINI_MAX_TOKENS: int = Field(default=2048, env="GEMINI_MAX_TOKENS")
     GEMINI_TIMEOUT: int = Field(default=30, env="GEMINI_TIMEOUT")
     
@@ -73,6 +87,8 @@ class Settings(BaseSettings):
         default=None,
         env="FIREBASE_STORAGE_BUCKET"
     )
+    # Number of asyncio Firestore clients (each with its own gRPC channel)
+    FIRESTORE_POOL_SIZE: int = Field(default=4, ge=1, env="FIRESTORE_POOL_SIZE")
     
     # ==================== FILE UPLOAD ====================
     MAX_UPLOAD_SIZE: int = Field(
@@ -87,6 +103,11 @@ class Settings(BaseSettings):
         default=str(BASE_DIR / "uploads"),
         env="UPLOAD_DIR"
     )
+    # Pick the lowest JPEG quality (60-85) whose SSIM against a
+    # high-quality encode stays above IMAGE_MIN_SSIM, instead of a fixed 85
+    # (smaller files for a few extra trial encodes per upload)
+    IMAGE_DYNAMIC_QUALITY: bool = Field(default=False, env="IMAGE_DYNAMIC_QUALITY")
+    IMAGE_MIN_SSIM: float = Field(default=0.985, ge=0, le=1, env="IMAGE_MIN_SSIM")
     
     # ==================== WASTE CATEGORIES ====================
     WASTE_CATEGORIES: List[str] = Field(
@@ -125,6 +146,9 @@ class Settings(BaseSettings):
     # ==================== RATE LIMITING ====================
     RATE_LIMIT_PER_MINUTE: int = Field(default=60, env="RATE_LIMIT_PER_MINUTE")
     RATE_LIMIT_SCAN_PER_HOUR: int = Field(default=50, env="RATE_LIMIT_SCAN_PER_HOUR")
+    # Shared counter store so limits hold across workers/instances
+    # (falls back to per-process memory when unset)
+    REDIS_URL: Optional[str] = Field(default=None, env="REDIS_URL")
     
     # ==================== LOGGING ====================
     LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
@@ -151,20 +175,23 @@ class Settings(BaseSettings):
     )
     
     # ==================== VALIDATORS ====================
-    @validator("SECRET_KEY")
+    @field_validator("SECRET_KEY")
+    @classmethod
     def validate_secret_key(cls, v):
         if len(v) < 32:
             raise ValueError("SECRET_KEY must be at least 32 characters long")
         return v
     
-    @validator("ENVIRONMENT")
+    @field_validator("ENVIRONMENT")
+    @classmethod
     def validate_environment(cls, v):
         allowed = ["development", "staging", "production"]
         if v not in allowed:
             raise ValueError(f"ENVIRONMENT must be one of {allowed}")
         return v
     
-    @validator("UPLOAD_DIR")
+    @field_validator("UPLOAD_DIR")
+    @classmethod
     def create_upload_dir(cls, v):
         Path(v).mkdir(parents=True, exist_ok=True)
         return v
@@ -191,10 +218,11 @@ class Settings(BaseSettings):
         }
     
     # ==================== CONFIG ====================
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = True
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True
+    )
 
 
 @lru_cache()
@@ -210,6 +238,16 @@ def get_settings() -> Settings:
 settings = get_settings()
 
 
+# ==================== LOOKUP TABLES ====================
+# Membership checks against the (ordered) WASTE_CATEGORIES list
+WASTE_CATEGORIES_SET = frozenset(settings.WASTE_CATEGORIES)
+
+# Levels ordered by point threshold, for bisect lookups
+_levels_by_threshold = sorted(settings.LEVEL_THRESHOLDS.items(), key=lambda item: item[1])
+LEVEL_THRESHOLD_VALUES = tuple(threshold for _, threshold in _levels_by_threshold)
+LEVEL_THRESHOLD_LEVELS = tuple(level for level, _ in _levels_by_threshold)
+
+
 # ==================== WASTE DISPOSAL GUIDELINES ====================
 WASTE_DISPOSAL_GUIDES = {
     "Recyclable Plastic": {
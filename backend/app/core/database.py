@@ -4,11 +4,17 @@ Handles Firestore and Firebase Admin SDK initialization
 """
 
 import firebase_admin
-from firebase_admin import credentials, firestore, storage
-from typing import Optional
+from firebase_admin import credentials, firestore, firestore_async, storage
+from typing import Optional, List, Tuple
+import asyncio
+import copy
 import logging
+import random
+import threading
 from pathlib import Path
 
+from cachetools import TTLCache
+
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -16,12 +22,24 @@ logger = logging.getLogger(__name__)
 # Global Firebase instances
 _firebase_app: Optional[firebase_admin.App] = None
 _firestore_client: Optional[firestore.Client] = None
+_firestore_async_pool: List[firestore_async.AsyncClient] = []
 _storage_bucket: Optional[object] = None
 
+# Guards initialize_firebase against concurrent first calls
+_init_lock = threading.Lock()
+
+# Number of scan summaries denormalized onto each user document
+RECENT_SCANS_LIMIT = 10
+
+# Read-through cache for get_document, keyed by (collection, document_id)
+_document_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+
 
 def initialize_firebase() -> Optional[firebase_admin.App]:
     """
     Initialize Firebase Admin SDK
+    Called once from the app lifespan; the client getters below don't
+    initialize lazily, so Firebase must be configured before serving
 
     Returns:
         Firebase app instance or None (if not initialized)
@@ -29,42 +47,53 @@ def initialize_firebase() -> Optional[firebase_admin.App]:
     Raises:
         Exception: If initialization fails
     """
-    global _firebase_app, _firestore_client, _storage_bucket
+    global _firebase_app, _firestore_client, _firestore_async_pool, _storage_bucket
 
-    if _firebase_app is not None:
-        logger.info("Firebase already initialized")
-        return _firebase_app
+    # Serialize concurrent callers so only one set of clients is created
+    with _init_lock:
+        if _firebase_app is not None:
+            logger.info("Firebase already initialized")
+            return _firebase_app
 
-    try:
-        # Check if credentials file exists
-        cred_path = Path(settings.FIREBASE_CREDENTIALS_PATH)
+        try:
+            # Check if credentials file exists
+            cred_path = Path(settings.FIREBASE_CREDENTIALS_PATH)
 
-        if not cred_path.exists():
-            logger.warning(f"Firebase credentials not found at {cred_path}")
-            logger.warning("Firebase features will be disabled")
-            return None
+            if not cred_path.exists():
+                logger.warning(f"Firebase credentials not found at {cred_path}")
+                logger.warning("Firebase features will be disabled")
+                return None
 
-        # Initialize with credentials
-        cred = credentials.Certificate(str(cred_path))
+            # Initialize with credentials
+            cred = credentials.Certificate(str(cred_path))
 
-        _firebase_app = firebase_admin.initialize_app(cred, {
-            'storageBucket': settings.FIREBASE_STORAGE_BUCKET
-        })
+            _firebase_app = firebase_admin.initialize_app(cred, {
+                'storageBucket': settings.FIREBASE_STORAGE_BUCKET
+            })
 
-        # Initialize Firestore
-        _firestore_client = firestore.client()
+            # Initialize Firestore (sync + asyncio clients share the app credentials).
+            # The asyncio clients are pooled so concurrent requests are spread
+            # over several gRPC channels instead of contending on one
+            _firestore_client = firestore.client()
+            _firestore_async_pool = [firestore_async.client()] + [
+                firestore_async.AsyncClient(
+                    credentials=_firebase_app.credential.get_credential(),
+                    project=_firebase_app.project_id
+                )
+                for _ in range(settings.FIRESTORE_POOL_SIZE - 1)
+            ]
 
-        # Initialize Storage (if bucket specified)
-        if settings.FIREBASE_STORAGE_BUCKET:
-            _storage_bucket = storage.bucket()
+            # Initialize Storage (if bucket specified)
+            if settings.FIREBASE_STORAGE_BUCKET:
+                _storage_bucket = storage.bucket()
 
-        logger.info("✅ Firebase initialized successfully")
+            logger.info("✅ Firebase initialized successfully")
 
-        return _firebase_app
+            return _firebase_app
 
-    except Exception as e:
-        logger.error(f"❌ Firebase initialization failed: {str(e)}")
-        raise
+        except Exception as e:
+            logger.error(f"❌ Firebase initialization failed: {str(e)}")
+            raise
 
 
 def get_firestore_client() -> Optional[firestore.Client]:
@@ -74,12 +103,23 @@ def get_firestore_client() -> Optional[firestore.Client]:
     Returns:
         Firestore client or None if not initialized
     """
-    if _firestore_client is None:
-        initialize_firebase()
-
     return _firestore_client
 
 
+def get_async_firestore_client() -> Optional[firestore_async.AsyncClient]:
+    """
+    Get an asyncio Firestore client from the pool (random selection)
+    Safe to share across coroutines
+
+    Returns:
+        Async Firestore client or None if not initialized
+    """
+    if not _firestore_async_pool:
+        return None
+
+    return _firestore_async_pool[random.randrange(len(_firestore_async_pool))]
+
+
 def get_storage_bucket() -> Optional[object]:
     """
     Get Firebase Storage bucket
@@ -87,9 +127,6 @@ def get_storage_bucket() -> Optional[object]:
     Returns:
         Storage bucket or None if not initialized
     """
-    if _storage_bucket is None:
-        initialize_firebase()
-
     return _storage_bucket
 
 
@@ -97,13 +134,14 @@ def close_firebase():
     """
     Close Firebase connections
     """
-    global _firebase_app, _firestore_client, _storage_bucket
+    global _firebase_app, _firestore_client, _firestore_async_pool, _storage_bucket
 
     try:
         if _firebase_app:
             firebase_admin.delete_app(_firebase_app)
             _firebase_app = None
             _firestore_client = None
+            _firestore_async_pool = []
             _storage_bucket = None
             logger.info("✅ Firebase connection closed")
     except Exception as e:
@@ -151,17 +189,64 @@ async def create_document(collection: str, document_id: str, data: dict) -> bool
         True if successful
     """
     try:
-        db = get_firestore_client()
-        db.collection(collection).document(document_id).set(data)
+        db = get_async_firestore_client()
+        await db.collection(collection).document(document_id).set(data)
+        invalidate_document(collection, document_id)
         return True
     except Exception as e:
         logger.error(f"Error creating document: {str(e)}")
         return False
 
 
+async def bulk_create_documents(collection: str, items: List[Tuple[str, dict]]) -> int:
+    """
+    Create or update many documents in Firestore using a BulkWriter
+
+    BulkWriter pipelines writes and retries throttled ones, which is much
+    faster than one set() per document for large batches.
+
+    Args:
+        collection: Collection name
+        items: (document_id, data) pairs
+
+    Returns:
+        Number of documents written successfully
+    """
+    def _write() -> int:
+        db = get_firestore_client()
+        written = 0
+
+        def _on_success(reference, result, bulk_writer):
+            nonlocal written
+            written += 1
+
+        writer = db.bulk_writer()
+        writer.on_write_result(_on_success)
+
+        for document_id, data in items:
+            writer.set(db.collection(collection).document(document_id), data)
+
+        writer.close()
+        return written
+
+    try:
+        # BulkWriter blocks (including retry back-off sleeps), keep it off the loop
+        written = await asyncio.to_thread(_write)
+
+        for document_id, _ in items:
+            invalidate_document(collection, document_id)
+
+        logger.info(f"Bulk wrote {written}/{len(items)} documents to {collection}")
+        return written
+    except Exception as e:
+        logger.error(f"Error bulk creating documents: {str(e)}")
+        return 0
+
+
 async def get_document(collection: str, document_id: str) -> Optional[dict]:
     """
     Get a document from Firestore
+    Results are cached in-process for a short TTL
 
     Args:
         collection: Collection name
@@ -170,10 +255,200 @@ async def get_document(collection: str, document_id: str) -> Optional[dict]:
     Returns:
         Document data or None
     """
+    key = (collection, document_id)
+    cached = _document_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+
     try:
-        db = get_firestore_client()
-        doc = db.collection(collection).document(document_id).get()
-        return doc.to_dict() if doc.exists else None
+        db = get_async_firestore_client()
+        doc = await db.collection(collection).document(document_id).get()
+        if not doc.exists:
+            return None
+
+        data = doc.to_dict()
+        _document_cache[key] = copy.deepcopy(data)
+        return data
     except Exception as e:
         logger.error(f"Error getting document: {str(e)}")
         return None
+
+
+def invalidate_document(collection: str, document_id: str):
+    """
+    Drop a document from the get_document cache
+
+    Args:
+        collection: Collection name
+        document_id: Document ID
+    """
+    _document_cache.pop((collection, document_id), None)
+
+
+async def get_documents(collection: str, document_ids: List[str]) -> List[Optional[dict]]:
+    """
+    Get several documents from Firestore in one batched read
+
+    Args:
+        collection: Collection name
+        document_ids: Document IDs
+
+    Returns:
+        Document data (or None if missing) in the same order as document_ids
+    """
+    if not document_ids:
+        return []
+
+    try:
+        db = get_async_firestore_client()
+        refs = [db.collection(collection).document(doc_id) for doc_id in document_ids]
+
+        # get_all does not guarantee result order, so index by document ID
+        found = {}
+        async for doc in db.get_all(refs):
+            found[doc.id] = doc.to_dict() if doc.exists else None
+
+        return [found.get(doc_id) for doc_id in document_ids]
+    except Exception as e:
+        logger.error(f"Error getting documents: {str(e)}")
+        return [None] * len(document_ids)
+
+
+async def upsert_user_aggregate(user_id: str, scan: dict, fields: Optional[dict] = None) -> bool:
+    """
+    Save a scan and fold it into the owning user's document
+
+    The scan document is written and a summary of it is appended to the
+    user's ``recent_scans`` array in one batched write. ArrayUnion and
+    Increment transforms need no read, so rapid scans by the same user
+    don't contend on a transaction; the array is trimmed lazily (see
+    trim_recent_scans).
+
+    Args:
+        user_id: User ID
+        scan: Scan document (must contain scan_id)
+        fields: Extra user fields to merge (e.g. Increment counters)
+
+    Returns:
+        True if successful
+    """
+    try:
+        db = get_async_firestore_client()
+        scan_ref = db.collection(FirestoreCollections.WASTE_SCANS).document(scan["scan_id"])
+        user_ref = db.collection(FirestoreCollections.USERS).document(user_id)
+
+        summary = _scan_summary(scan)
+
+        batch = db.batch()
+        batch.set(scan_ref, scan)
+        batch.set(user_ref, {
+            **(fields or {}),
+            "recent_scans": firestore.ArrayUnion([summary])
+        }, merge=True)
+        await batch.commit()
+
+        invalidate_document(FirestoreCollections.USERS, user_id)
+        return True
+    except Exception as e:
+        logger.error(f"Error updating user aggregate: {str(e)}")
+        return False
+
+
+async def remove_scan_from_user_aggregate(user_id: str, scan: dict) -> bool:
+    """
+    Delete a scan and take it back out of the owning user's document
+
+    Undoes upsert_user_aggregate in one batched write: the scan summary is
+    removed from ``recent_scans`` and the scan's contribution is
+    subtracted from the Increment counters.
+
+    Args:
+        user_id: User ID
+        scan: Stored scan document (must contain scan_id)
+
+    Returns:
+        True if successful
+    """
+    try:
+        db = get_async_firestore_client()
+        scan_ref = db.collection(FirestoreCollections.WASTE_SCANS).document(scan["scan_id"])
+        user_ref = db.collection(FirestoreCollections.USERS).document(user_id)
+
+        batch = db.batch()
+        batch.delete(scan_ref)
+        batch.set(user_ref, {
+            "total_scans": firestore.Increment(-1),
+            "total_points": firestore.Increment(-(scan.get("points_earned") or 0)),
+            # Scans saved before co2_saved_kg was stored contribute 0
+            "co2_saved_kg": firestore.Increment(-(scan.get("co2_saved_kg") or 0.0)),
+            "recent_scans": firestore.ArrayRemove([_scan_summary(scan)])
+        }, merge=True)
+        await batch.commit()
+
+        invalidate_document(FirestoreCollections.USERS, user_id)
+        return True
+    except Exception as e:
+        logger.error(f"Error removing scan from user aggregate: {str(e)}")
+        return False
+
+
+def _scan_summary(scan: dict) -> dict:
+    """
+    Summary of a scan as stored in the user's recent_scans array
+    (ArrayRemove matches it exactly, so both writers must build it here)
+
+    Args:
+        scan: Scan document
+
+    Returns:
+        Summary dictionary
+    """
+    return {
+        "scan_id": scan["scan_id"],
+        "item_name": scan.get("item_name"),
+        "category": scan.get("category"),
+        "points_earned": scan.get("points_earned", 0),
+        "timestamp": scan.get("timestamp")
+    }
+
+
+def newest_recent_scans(recent_scans: List[dict]) -> List[dict]:
+    """
+    Newest RECENT_SCANS_LIMIT entries of a user's recent_scans array
+
+    Args:
+        recent_scans: Stored array (append order, may exceed the limit)
+
+    Returns:
+        Scan summaries, newest first
+    """
+    ordered = sorted(recent_scans, key=lambda scan: scan.get("timestamp") or "", reverse=True)
+    return ordered[:RECENT_SCANS_LIMIT]
+
+
+async def trim_recent_scans(user_id: str, recent_scans: List[dict]) -> None:
+    """
+    Drop old entries from a user's recent_scans array once it has grown
+    past twice the limit (writes append without reading, so it only grows)
+
+    ArrayRemove deletes exactly the stale entries, so summaries appended
+    concurrently are kept.
+
+    Args:
+        user_id: User ID
+        recent_scans: Stored array, as read from the user document
+    """
+    if len(recent_scans) <= 2 * RECENT_SCANS_LIMIT:
+        return
+
+    keep = {scan.get("scan_id") for scan in newest_recent_scans(recent_scans)}
+    stale = [scan for scan in recent_scans if scan.get("scan_id") not in keep]
+
+    try:
+        db = get_async_firestore_client()
+        await db.collection(FirestoreCollections.USERS).document(user_id).update({
+            "recent_scans": firestore.ArrayRemove(stale)
+        })
+        invalidate_document(FirestoreCollections.USERS, user_id)
+    except Exception as e:
+        logger.error(f"Error trimming recent scans: {str(e)}")
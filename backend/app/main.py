@@ -3,25 +3,34 @@ WasteWise FastAPI Application
 Main application entry point with all configurations
 """
 
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, File, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
+import asyncio
 import time
+import gzip
+import random
 import logging
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Optional, Tuple
 import os
 
+import orjson
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from starlette.datastructures import Headers
 
 from app.core.config import settings
-from app.core.database import initialize_firebase, close_firebase
-from app.services.gemini_service import get_gemini_service
+from app.core.database import initialize_firebase, close_firebase, get_firestore_client
+from app.services.gemini_service import get_gemini_service, shutdown_image_pool
+from app.utils.image_processor import get_image_processor, process_uploaded_image, shutdown_batch_pool
 
 # Import routes
 from app.api.routes import waste
@@ -35,47 +44,89 @@ if settings.LOG_FILE:
         os.makedirs(log_dir, exist_ok=True)
 
 # ==================== CONFIGURE LOGGING ====================
+# Records are pushed onto an in-memory queue; a background listener thread
+# owns the console/file handlers so request handlers never block on I/O.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue,
+    logging.StreamHandler(),
+    logging.FileHandler(settings.LOG_FILE) if settings.LOG_FILE else logging.NullHandler()
+)
+
 logging.basicConfig(
     level=getattr(logging, settings.LOG_LEVEL),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(settings.LOG_FILE) if settings.LOG_FILE else logging.NullHandler()
-    ]
+    handlers=[QueueHandler(_log_queue)]
 )
 
 logger = logging.getLogger(__name__)
 
 # Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.REDIS_URL or "memory://",
+    strategy="moving-window"
+)
+
+# Settings read on the request path, resolved once (restart to pick up changes)
+_IS_PROD = settings.is_production
+_API_VERSION = settings.APP_VERSION
+
+# Fraction of successful requests logged at INFO (errors are always logged)
+REQUEST_LOG_SAMPLE_RATE = 0.1
+
+# Health probe results are reused for this long (absorbs LB / uptime checks)
+HEALTH_CACHE_TTL_SECONDS = 10
+_health_cache: Optional[Tuple[float, dict]] = None
 
 # ==================== LIFESPAN EVENTS ====================
 
+async def _warm_gemini():
+    """
+    Validate the Gemini API key in the background so startup doesn't wait
+    on a Gemini round-trip (also pre-opens the channel scans will reuse)
+    """
+    try:
+        gemini_service = get_gemini_service()
+        if await gemini_service.validate_api_key_async():
+            logger.info("✅ Gemini AI connected")
+        else:
+            logger.warning("⚠️ Gemini API key validation failed")
+    except Exception as e:
+        logger.error(f"❌ Gemini initialization failed: {str(e)}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifespan events - runs on startup and shutdown
     """
     # Startup
+    _log_listener.start()
     logger.info("🚀 Starting WasteWise API...")
 
-    # Initialize Firebase
+    # Initialize Firebase (database getters don't initialize lazily)
     try:
-        initialize_firebase()
-        logger.info("✅ Firebase initialized")
+        firebase_app = initialize_firebase()
     except Exception as e:
         logger.error(f"❌ Firebase initialization failed: {str(e)}")
-        # Continue anyway for development
+        if _IS_PROD:
+            raise
+        firebase_app = None  # Continue anyway for development
+
+    if firebase_app is not None:
+        logger.info("✅ Firebase initialized")
+    elif _IS_PROD:
+        raise RuntimeError("Firebase credentials are required in production")
+
+    # Validate Gemini API (off the startup path)
+    gemini_warmup = asyncio.create_task(_warm_gemini())
 
-    # Validate Gemini API
+    # Warm up image processor so the first scan doesn't pay for it
     try:
-        gemini_service = get_gemini_service()
-        if gemini_service.validate_api_key():
-            logger.info("✅ Gemini AI connected")
-        else:
-            logger.warning("⚠️ Gemini API key validation failed")
+        get_image_processor()
     except Exception as e:
-        logger.error(f"❌ Gemini initialization failed: {str(e)}")
+        logger.error(f"❌ Image processor initialization failed: {str(e)}")
 
     # Create required directories (for uploaded files, etc.)
     Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
@@ -88,6 +139,12 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("🛑 Shutting down WasteWise API...")
 
+    if not gemini_warmup.done():
+        gemini_warmup.cancel()
+
+    shutdown_image_pool()
+    shutdown_batch_pool()
+
     try:
         close_firebase()
         logger.info("✅ Firebase connection closed")
@@ -95,12 +152,14 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Firebase shutdown error: {str(e)}")
 
     logger.info("✅ Application shutdown complete")
+    _log_listener.stop()
 
 # ==================== CREATE APP ====================
 
 app = FastAPI(
     **settings.fastapi_kwargs,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add rate limiter to app state
@@ -119,57 +178,84 @@ app.add_middleware(
     expose_headers=["X-Total-Count", "X-Page", "X-Per-Page"]
 )
 
-# GZip Compression
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# GZip Compression - skip small bodies where zlib costs more than it saves;
+# level 5 is ~2-3x faster than 9 for a ~1% worse ratio
+app.add_middleware(GZipMiddleware, minimum_size=2048, compresslevel=5)
 
-# Trusted Host (security)
-if settings.is_production:
-    app.add_middleware(
-        TrustedHostMiddleware,
-        allowed_hosts=[
-            "*.wastewise.com",
-            "wastewise.com",
-            "*.onrender.com",          # Accept ALL onrender subdomains
-            "wastewise-r6fh.onrender.com" 
-        ]
-    )
+# Trusted Host (security) - literal hosts are a set lookup and the wildcard
+# subdomains share one precompiled pattern, instead of TrustedHostMiddleware
+# scanning every pattern per request
+_TRUSTED_HOSTS = frozenset({
+    "wastewise.com",
+    "wastewise-r6fh.onrender.com"
+})
+_TRUSTED_HOST_PATTERN = re.compile(r".+\.(?:wastewise\.com|onrender\.com)")  # Accept ALL onrender subdomains
+
+
+class TrustedHostGuard:
+    """Reject requests whose Host header isn't one of ours"""
+
+    def __init__(self, app):
+        self.app = app
 
-# Request logging middleware
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        host = Headers(scope=scope).get("host", "").split(":")[0]
+        if host in _TRUSTED_HOSTS or _TRUSTED_HOST_PATTERN.fullmatch(host):
+            await self.app(scope, receive, send)
+        else:
+            response = PlainTextResponse("Invalid host header", status_code=400)
+            await response(scope, receive, send)
+
+
+if settings.is_production:
+    app.add_middleware(TrustedHostGuard)
+
+# Headers added to every response
+_STATIC_RESPONSE_HEADERS = {
+    "X-API-Version": _API_VERSION,
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains"
+}
+
+# Request logging + security headers middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all requests with timing"""
-    start_time = time.time()
+    """Log all requests with timing and add API/security headers"""
+    start_time = time.perf_counter()
 
     # Process request
     response = await call_next(request)
 
     # Calculate duration
-    duration = time.time() - start_time
-
-    # Log request
-    logger.info(
-        f"{request.method} {request.url.path} | "
-        f"Status: {response.status_code} | "
-        f"Duration: {duration:.3f}s | "
-        f"Client: {request.client.host if request.client else 'unknown'}"
-    )
+    duration = time.perf_counter() - start_time
 
-    # Add custom headers
-    response.headers["X-Process-Time"] = str(duration)
-    response.headers["X-API-Version"] = settings.APP_VERSION
-
-    return response
-
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    """Add security headers to all responses"""
-    response = await call_next(request)
+    # Log request - all errors, a sample of successful requests
+    if response.status_code >= 400:
+        level = logging.WARNING
+    elif random.random() < REQUEST_LOG_SAMPLE_RATE:
+        level = logging.INFO
+    else:
+        level = logging.DEBUG
+
+    logger.log(
+        level,
+        "%s %s | Status: %d | Duration: %.3fs | Client: %s",
+        request.method,
+        request.url.path,
+        response.status_code,
+        duration,
+        request.client.host if request.client else "unknown"
+    )
 
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+    # Add custom + security headers
+    response.headers["X-Process-Time"] = f"{duration:.4f}"
+    response.headers.update(_STATIC_RESPONSE_HEADERS)
 
     return response
 
@@ -180,7 +266,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     """Handle validation errors"""
     logger.warning(f"Validation error on {request.url.path}: {exc.errors()}")
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "success": False,
@@ -196,12 +282,12 @@ async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception on {request.url.path}: {str(exc)}", exc_info=True)
 
     # Don't expose internal errors in production
-    if settings.is_production:
+    if _IS_PROD:
         message = "An internal error occurred"
     else:
         message = str(exc)
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "success": False,
@@ -212,35 +298,122 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 # ==================== ROOT ROUTES ====================
 
+# "/" and "/info" only depend on settings, so their bodies are serialized and
+# gzipped once at import time and served as raw bytes
+MAX_UPLOAD_SIZE_MB = settings.MAX_UPLOAD_SIZE / (1024 * 1024)
+
+_ROOT_PAYLOAD = {
+    "success": True,
+    "message": "Welcome to WasteWise API",
+    "version": settings.APP_VERSION,
+    "environment": settings.ENVIRONMENT,
+    "documentation": "/docs" if not settings.is_production else None,
+    "endpoints": {
+        "health": "/health",
+        "api": settings.API_V1_PREFIX
+    }
+}
+
+_INFO_PAYLOAD = {
+    "success": True,
+    "api": {
+        "name": settings.APP_NAME,
+        "version": settings.APP_VERSION,
+        "description": settings.APP_DESCRIPTION,
+        "environment": settings.ENVIRONMENT
+    },
+    "features": {
+        "waste_identification": True,
+        "gamification": True,
+        "leaderboard": True,
+        "user_authentication": True,
+        "scan_history": True,
+        "educational_content": True
+    },
+    "supported_waste_categories": settings.WASTE_CATEGORIES,
+    "limits": {
+        "max_upload_size_mb": MAX_UPLOAD_SIZE_MB,
+        "allowed_image_types": settings.ALLOWED_IMAGE_TYPES,
+        "rate_limit_per_minute": settings.RATE_LIMIT_PER_MINUTE,
+        "scan_limit_per_hour": settings.RATE_LIMIT_SCAN_PER_HOUR
+    },
+    "ai_model": {
+        "provider": "Google Gemini",
+        "model": settings.GEMINI_MODEL,
+        "capabilities": [
+            "Image recognition",
+            "Waste classification",
+            "Disposal guidance",
+            "Environmental impact analysis"
+        ]
+    }
+}
+
+
+def _precompress_json(payload: dict) -> Tuple[bytes, bytes]:
+    """
+    Serialize a constant payload once
+
+    Args:
+        payload: JSON-serializable response body
+
+    Returns:
+        Tuple of (plain_body, gzipped_body)
+    """
+    body = orjson.dumps(payload)
+    return body, gzip.compress(body, compresslevel=9)
+
+
+def _static_json_response(request: Request, bodies: Tuple[bytes, bytes]) -> Response:
+    """
+    Serve a precompressed body, falling back to plain JSON for clients
+    that don't accept gzip
+
+    Args:
+        request: Incoming request
+        bodies: Result of _precompress_json
+
+    Returns:
+        Raw JSON response
+    """
+    body, gzipped = bodies
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=gzipped,
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+    return Response(content=body, media_type="application/json", headers={"Vary": "Accept-Encoding"})
+
+
+_ROOT_BODIES = _precompress_json(_ROOT_PAYLOAD)
+_INFO_BODIES = _precompress_json(_INFO_PAYLOAD)
+
 @app.get("/", tags=["Root"])
-async def root():
+async def root(request: Request):
     """
     Root endpoint - API information
     """
-    return {
-        "success": True,
-        "message": "Welcome to WasteWise API",
-        "version": settings.APP_VERSION,
-        "environment": settings.ENVIRONMENT,
-        "documentation": "/docs" if not settings.is_production else None,
-        "endpoints": {
-            "health": "/health",
-            "api": settings.API_V1_PREFIX
-        }
-    }
+    return _static_json_response(request, _ROOT_BODIES)
 
 @app.get("/health", tags=["Health"])
 @limiter.limit("30/minute")
 async def health_check(request: Request):
     """
     Health check endpoint
-    Returns API status and service health
+    Returns API status and service health (probes cached for a few seconds)
     """
+    global _health_cache
+
+    if _health_cache and time.monotonic() - _health_cache[0] < HEALTH_CACHE_TTL_SECONDS:
+        return _health_cache[1]
+
     # Check Gemini service
     gemini_status = "unknown"
     try:
         gemini_service = get_gemini_service()
-        gemini_status = "healthy" if gemini_service.validate_api_key() else "unhealthy"
+        is_valid = await gemini_service.validate_api_key_async()
+        gemini_status = "healthy" if is_valid else "unhealthy"
     except Exception as e:
         gemini_status = f"error: {str(e)}"
         logger.error(f"Gemini health check failed: {str(e)}")
@@ -248,17 +421,16 @@ async def health_check(request: Request):
     # Check Firebase
     firebase_status = "unknown"
     try:
-        from app.core.database import get_firestore_client
         db = get_firestore_client()
         firebase_status = "healthy" if db else "unhealthy"
     except Exception as e:
         firebase_status = f"error: {str(e)}"
         logger.error(f"Firebase health check failed: {str(e)}")
 
-    return {
+    payload = {
         "success": True,
         "status": "healthy",
-        "version": settings.APP_VERSION,
+        "version": _API_VERSION,
         "environment": settings.ENVIRONMENT,
         "services": {
             "api": "healthy",
@@ -268,85 +440,44 @@ async def health_check(request: Request):
         "uptime": "N/A"  # Can be calculated from startup time
     }
 
+    _health_cache = (time.monotonic(), payload)
+    return payload
+
 @app.get("/info", tags=["Info"])
-async def api_info():
+async def api_info(request: Request):
     """
     Detailed API information
     """
-    return {
-        "success": True,
-        "api": {
-            "name": settings.APP_NAME,
-            "version": settings.APP_VERSION,
-            "description": settings.APP_DESCRIPTION,
-            "environment": settings.ENVIRONMENT
-        },
-        "features": {
-            "waste_identification": True,
-            "gamification": True,
-            "leaderboard": True,
-            "user_authentication": True,
-            "scan_history": True,
-            "educational_content": True
-        },
-        "supported_waste_categories": settings.WASTE_CATEGORIES,
-        "limits": {
-            "max_upload_size_mb": settings.MAX_UPLOAD_SIZE / (1024 * 1024),
-            "allowed_image_types": settings.ALLOWED_IMAGE_TYPES,
-            "rate_limit_per_minute": settings.RATE_LIMIT_PER_MINUTE,
-            "scan_limit_per_hour": settings.RATE_LIMIT_SCAN_PER_HOUR
-        },
-        "ai_model": {
-            "provider": "Google Gemini",
-            "model": settings.GEMINI_MODEL,
-            "capabilities": [
-                "Image recognition",
-                "Waste classification",
-                "Disposal guidance",
-                "Environmental impact analysis"
-            ]
-        }
-    }
+    return _static_json_response(request, _INFO_BODIES)
 
 # ==================== TEST ENDPOINTS (Development Only) ====================
 
 if not settings.is_production:
 
     @app.post("/test/upload", tags=["Testing"])
-    async def test_image_upload(request: Request):
+    async def test_image_upload(file: UploadFile = File(...)):
         """
         Test endpoint for image upload
         Only available in development
         """
-        from fastapi import File, UploadFile
-
-        @app.post("/test/upload-file")
-        async def upload_test_file(file: UploadFile = File(...)):
-            from app.utils.image_processor import process_uploaded_image
-
-            try:
-                # Read file
-                file_data = await file.read()
-
-                # Process
-                result = process_uploaded_image(file_data, file.filename)
+        try:
+            # Process straight from the spooled upload
+            result = process_uploaded_image(file.file, file.filename)
 
-                return {
-                    "success": True,
-                    "message": "Image processed successfully",
-                    "metadata": result["metadata"],
-                    "image_hash": result["image_hash"]
+            return {
+                "success": True,
+                "message": "Image processed successfully",
+                "metadata": result["metadata"],
+                "image_hash": result["image_hash"]
+            }
+        except Exception as e:
+            return ORJSONResponse(
+                status_code=400,
+                content={
+                    "success": False,
+                    "error": str(e)
                 }
-            except Exception as e:
-                return JSONResponse(
-                    status_code=400,
-                    content={
-                        "success": False,
-                        "error": str(e)
-                    }
-                )
-
-        return await upload_test_file(request)
+            )
 
     @app.get("/test/gemini", tags=["Testing"])
     async def test_gemini():
@@ -358,7 +489,7 @@ if not settings.is_production:
             gemini_service = get_gemini_service()
 
             # Simple test
-            test_response = gemini_service.model.generate_content(
+            test_response = await gemini_service.model.generate_content_async(
                 "Respond with a JSON object: {\"status\": \"working\", \"message\": \"Gemini AI is operational\"}"
             )
 
@@ -369,7 +500,7 @@ if not settings.is_production:
                 "test_response": test_response.text
             }
         except Exception as e:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=500,
                 content={
                     "success": False,
@@ -377,33 +508,32 @@ if not settings.is_production:
                 }
             )
 
+    _TEST_CONFIG_BODIES = _precompress_json({
+        "success": True,
+        "config": {
+            "app_name": settings.APP_NAME,
+            "version": _API_VERSION,
+            "environment": settings.ENVIRONMENT,
+            "debug": settings.DEBUG,
+            "gemini_model": settings.GEMINI_MODEL,
+            "upload_dir": settings.UPLOAD_DIR,
+            "max_upload_size_mb": MAX_UPLOAD_SIZE_MB,
+            "cors_origins": settings.BACKEND_CORS_ORIGINS,
+            "waste_categories": settings.WASTE_CATEGORIES
+        }
+    })
+
     @app.get("/test/config", tags=["Testing"])
-    async def test_config():
+    async def test_config(request: Request):
         """
         View current configuration
         Only available in development
         """
-        return {
-            "success": True,
-            "config": {
-                "app_name": settings.APP_NAME,
-                "version": settings.APP_VERSION,
-                "environment": settings.ENVIRONMENT,
-                "debug": settings.DEBUG,
-                "gemini_model": settings.GEMINI_MODEL,
-                "upload_dir": settings.UPLOAD_DIR,
-                "max_upload_size_mb": settings.MAX_UPLOAD_SIZE / (1024 * 1024),
-                "cors_origins": settings.BACKEND_CORS_ORIGINS,
-                "waste_categories": settings.WASTE_CATEGORIES
-            }
-        }
+        return _static_json_response(request, _TEST_CONFIG_BODIES)
 
 # ==================== API ROUTES ====================
 
 # Include API routers
-from app.api.routes import waste
-# from app.api.routes import user, auth, leaderboard
-
 app.include_router(
     waste.router,
     prefix=f"{settings.API_V1_PREFIX}/waste",
@@ -443,10 +573,15 @@ if __name__ == "__main__":
     print(f"📚 API Docs at http://localhost:8000/docs")
     print("=" * 60)
 
+    # uvloop/httptools ship with uvicorn[standard]; reload mode only
+    # supports a single worker
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
-        port=8000,
+        port=int(os.environ.get("PORT", 8000)),  # Render and similar hosts assign PORT
         reload=settings.DEBUG,
+        loop="asyncio" if settings.DEBUG else "uvloop",
+        http="httptools",
+        workers=1 if settings.DEBUG else settings.WEB_CONCURRENCY,
         log_level=settings.LOG_LEVEL.lower()
-)
+    )
@@ -3,22 +3,447 @@ Gemini AI Service
 Handles all interactions with Google's Gemini AI for waste identification
 """
 
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 import google.generativeai as genai
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator
 import base64
 import io
 from PIL import Image
+import imagehash
 import json
 import logging
 from pathlib import Path
+import re
+import threading
 import time
+from types import MappingProxyType
 
-from app.core.config import settings, WASTE_DISPOSAL_GUIDES
+import orjson
+import redis.asyncio as aioredis
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+from cachetools import TTLCache
+
+from app.core.config import settings, WASTE_DISPOSAL_GUIDES, WASTE_CATEGORIES_SET
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 
+# Compact JSON-schema style prompt; fewer input tokens means faster prefill
+_PROMPT_TEMPLATE = """Identify the primary waste item in this image. Reply with JSON only:
+{{"item_name":str (specific, e.g. "Plastic PET Bottle"),"category":one of [{categories}],"confidence":float 0-1,"subcategory":str (e.g. "Aluminum Can"),"recyclable":bool,"disposal_steps":[str, 3+ actionable steps],"bin_color":str (BLUE|GREEN|BLACK|RED|...),"environmental_impact":{{"co2_saved_kg":float if recycled,"decomposition_time":str (in landfill),"recycling_potential":str}},"additional_tips":[str],"warnings":[str],"alternatives":str (how to reduce this waste)}}
+Rules: be specific; if unsure use "Unknown" with confidence<0.5; if several items, pick the most prominent; follow common local recycling standards."""
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Pixel modes sent to Gemini without conversion
+_GEMINI_IMAGE_MODES = frozenset({"RGB", "L"})
+
+# Structured-output schema for identification replies (mirrors the prompt)
+_STRING = {"type": "STRING"}
+_STRING_LIST = {"type": "ARRAY", "items": _STRING}
+WASTE_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "item_name": _STRING,
+        "category": _STRING,
+        "confidence": {"type": "NUMBER"},
+        "subcategory": _STRING,
+        "recyclable": {"type": "BOOLEAN"},
+        "disposal_steps": _STRING_LIST,
+        "bin_color": _STRING,
+        "environmental_impact": {
+            "type": "OBJECT",
+            "properties": {
+                "co2_saved_kg": {"type": "NUMBER"},
+                "decomposition_time": _STRING,
+                "recycling_potential": _STRING
+            }
+        },
+        "additional_tips": _STRING_LIST,
+        "warnings": _STRING_LIST,
+        "alternatives": _STRING
+    },
+    "required": ["item_name", "category", "confidence", "recyclable", "disposal_steps"]
+}
+
+# Categories that earn the difficult-disposal bonus
+_BONUS_CATEGORIES = frozenset({"Hazardous Waste", "E-Waste"})
+
+# Educational content is regenerated at most once a day per category
+EDU_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Fast-model results below this confidence are re-run on the main model
+ESCALATION_CONFIDENCE = 0.7
+
+# Returned when a reply can't be parsed. Built once; lists are tuples so the
+# shared values can't be mutated through a response
+_FALLBACK_TEMPLATE = MappingProxyType({
+    "item_name": "Unknown Item",
+    "category": "Unknown",
+    "confidence": 0.3,
+    "subcategory": "Unidentified",
+    "recyclable": False,
+    "disposal_steps": (
+        "Unable to identify waste type clearly",
+        "Please retake photo with better lighting",
+        "Ensure the item is clearly visible",
+        "Consult local waste management guidelines"
+    ),
+    "bin_color": "GREY",
+    "environmental_impact": {
+        "co2_saved_kg": 0.0,
+        "decomposition_time": "Unknown",
+        "recycling_potential": "Unknown"
+    },
+    "additional_tips": (
+        "Try taking a clearer photo",
+        "Ensure good lighting",
+        "Focus on one item at a time"
+    ),
+    "warnings": (
+        "Could not identify waste type with high confidence",
+    ),
+    "alternatives": "Please try scanning again"
+})
+
+# Prepended to the identification prompt for multi-image requests
+_BATCH_PROMPT_PREFIX = """You are given {count} images, each preceded by its label "Image N". Analyze each one independently and reply with a JSON array of exactly {count} objects, one per image, each following the format below plus "image_index": the N of the image it describes.
+"""
+
+# Batched replies tag every object with its image, so results can't be
+# attributed to the wrong request if the model drops or reorders items
+WASTE_BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        **WASTE_RESPONSE_SCHEMA,
+        "properties": {"image_index": {"type": "INTEGER"}, **WASTE_RESPONSE_SCHEMA["properties"]},
+        "required": ["image_index", *WASTE_RESPONSE_SCHEMA["required"]]
+    }
+}
+
+# Fields sent to streaming clients before the full reply has been generated
+_PARTIAL_FIELDS = ("item_name", "category")
+_PARTIAL_FIELD_PATTERN = re.compile(
+    r'"(' + "|".join(_PARTIAL_FIELDS) + r')"\s*:\s*"((?:[^"\\]|\\.)*)"'
+)
+
+
+# ==================== RESPONSE MODEL ====================
+
+class WasteResult(BaseModel):
+    """
+    Validated core of a Gemini identification reply
+    
+    Only the fields the API relies on are declared; everything else Gemini
+    returns (disposal_steps, bin_color, ...) is passed through as extras.
+    """
+    model_config = ConfigDict(extra="allow")
+    
+    item_name: str
+    category: str
+    confidence: float
+    
+    @field_validator("category")
+    @classmethod
+    def default_unknown_category(cls, v: str) -> str:
+        if v not in WASTE_CATEGORIES_SET:
+            logger.warning(f"⚠️ Unknown category: {v}, defaulting to 'Unknown'")
+            return "Unknown"
+        return v
+    
+    @field_validator("confidence")
+    @classmethod
+    def clamp_confidence(cls, v: float) -> float:
+        return max(0.0, min(1.0, v))
+
+
+def _chunk_text(chunk: Any) -> str:
+    """
+    Text of one streamed Gemini chunk
+    chunk.text raises ValueError on chunks without text parts (e.g. the
+    final chunk that only carries the finish reason or usage metadata),
+    so read the parts directly
+    
+    Args:
+        chunk: Streamed GenerateContentResponse chunk
+        
+    Returns:
+        Chunk text ("" if it has none)
+    """
+    if not chunk.candidates:
+        return ""
+    return "".join(part.text for part in chunk.candidates[0].content.parts if part.text)
+
+
+# ==================== SCAN RESULT CACHE ====================
+
+SCAN_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+SCAN_CACHE_MAX_DISTANCE = 5  # Max Hamming distance for a near-duplicate hit
+_SCAN_CACHE_PREFIX = "wastecache"
+# The 64-bit hash is split into bands for candidate lookup. Two hashes
+# within distance d differ in at most d bands, so d + 1 bands guarantee a
+# shared band for every hit the distance threshold accepts
+_HASH_BITS = 64
+_HASH_BANDS = SCAN_CACHE_MAX_DISTANCE + 1
+_BAND_BOUNDS = [round(i * _HASH_BITS / _HASH_BANDS) for i in range(_HASH_BANDS + 1)]
+
+
+class PerceptualScanCache:
+    """
+    Redis cache of identification results keyed by the image's perceptual hash
+    
+    Identical-looking photos hit on a single GET. Near-duplicates (re-shot
+    from a slightly different angle or exposure) are found by bucketing each
+    hash under its ~11-bit bands and comparing the candidates that share a band.
+    """
+    
+    def __init__(self, redis_client: aioredis.Redis):
+        """
+        Args:
+            redis_client: Shared asyncio Redis client
+        """
+        self._redis = redis_client
+    
+    @staticmethod
+    def image_hash(image: Image.Image) -> str:
+        """
+        Compute the 64-bit DCT perceptual hash of an image
+        
+        Args:
+            image: PIL Image object
+            
+        Returns:
+            16-character hex hash
+        """
+        # pHash works on a 32x32 grayscale image; downsample cheaply first
+        return str(imagehash.phash(image.resize((32, 32), Image.Resampling.BOX)))
+    
+    @staticmethod
+    def _result_key(image_hash: str) -> str:
+        return f"{_SCAN_CACHE_PREFIX}:{image_hash}"
+    
+    @staticmethod
+    def _band_keys(image_hash: str) -> List[str]:
+        value = int(image_hash, 16)
+        return [
+            f"{_SCAN_CACHE_PREFIX}:band:{i}:{(value >> start) & ((1 << (end - start)) - 1):x}"
+            for i, (start, end) in enumerate(zip(_BAND_BOUNDS, _BAND_BOUNDS[1:]))
+        ]
+    
+    async def get(self, image_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result for this hash or its nearest near-duplicate
+        
+        Args:
+            image_hash: Hex perceptual hash
+            
+        Returns:
+            Cached result dictionary or None on miss
+        """
+        try:
+            raw = await self._redis.get(self._result_key(image_hash))
+            
+            if raw is None:
+                target = int(image_hash, 16)
+                candidates = await self._redis.sunion(self._band_keys(image_hash))
+                best_distance, best_hash = SCAN_CACHE_MAX_DISTANCE + 1, None
+                for candidate in candidates:
+                    candidate = candidate.decode()
+                    distance = (target ^ int(candidate, 16)).bit_count()
+                    if distance < best_distance:
+                        best_distance, best_hash = distance, candidate
+                if best_hash is not None:
+                    raw = await self._redis.get(self._result_key(best_hash))
+            
+            return orjson.loads(raw) if raw is not None else None
+        except Exception as e:
+            logger.warning(f"⚠️ Scan cache lookup failed: {str(e)}")
+            return None
+    
+    async def set(self, image_hash: str, result: Dict[str, Any]):
+        """
+        Store a result under its hash and register the hash in its bands
+        
+        Args:
+            image_hash: Hex perceptual hash
+            result: Identification result
+        """
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.setex(self._result_key(image_hash), SCAN_CACHE_TTL_SECONDS, orjson.dumps(result))
+            for band_key in self._band_keys(image_hash):
+                pipe.sadd(band_key, image_hash)
+                pipe.expire(band_key, SCAN_CACHE_TTL_SECONDS)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Scan cache write failed: {str(e)}")
+
+
+# ==================== IMAGE PREPARATION ====================
+# Decoding/resizing is CPU-bound, so it runs in a process pool; workers hand
+# back encoded JPEG bytes (PIL images don't pickle cheaply)
+
+GEMINI_MAX_IMAGE_SIZE = 2048  # Max edge length sent to Gemini
+GEMINI_JPEG_QUALITY = 85
+# Per API worker process; the CPUs are shared between WEB_CONCURRENCY workers
+IMAGE_POOL_WORKERS = max(1, min(4, (os.cpu_count() or 1) // settings.WEB_CONCURRENCY))
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _prepare_image(image_data: bytes) -> Tuple[Image.Image, bool]:
+    """
+    Prepare and validate image for Gemini processing
+    
+    Args:
+        image_data: Raw image bytes
+        
+    Returns:
+        Tuple of (PIL Image, unchanged) where unchanged means the source
+        is a JPEG Gemini can take as-is (no downscale or conversion needed)
+        
+    Raises:
+        ValueError: If image is invalid or too large
+    """
+    try:
+        # Open image
+        image = Image.open(io.BytesIO(image_data))
+        
+        # Validate image
+        if image.size[0] * image.size[1] > 4096 * 4096:
+            raise ValueError("Image resolution too high (max 4096x4096)")
+        
+        # Let libjpeg scale the DCT by 1/2, 1/4 or 1/8 while decoding so
+        # we never materialize pixels the resize would throw away
+        max_size = GEMINI_MAX_IMAGE_SIZE
+        source_size = image.size
+        if image.format == 'JPEG':
+            image.draft('RGB', (max_size, max_size))
+            image.load()
+        
+        # Convert to RGB if necessary. Drafted JPEGs already decode to
+        # RGB, and grayscale is sent as-is (a third of the pixel data)
+        if image.mode not in _GEMINI_IMAGE_MODES:
+            image = image.convert('RGB')
+        
+        # Resize if still too large (optimize for API)
+        if max(image.size) > max_size:
+            ratio = max_size / max(image.size)
+            new_size = tuple(int(dim * ratio) for dim in image.size)
+            # reducing_gap: box-reduce by integer factors first, then
+            # run LANCZOS on the much smaller intermediate image
+            image = image.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+            logger.info(f"📐 Image resized to: {new_size}")
+        
+        # convert()/resize() return new images without a format, and
+        # draft() shrinks the size, so this only holds for untouched JPEGs
+        unchanged = image.format == 'JPEG' and image.size == source_size
+        
+        return image, unchanged
+        
+    except Exception as e:
+        logger. error(f"❌ Image preparation failed: {str(e)}")
+        raise ValueError(f"Invalid image format: {str(e)}")
+
+
+def _prepare_image_payload(image_data: bytes, with_hash: bool) -> Tuple[bytes, Optional[str]]:
+    """
+    Prepare an image for Gemini (runs in the image process pool)
+    
+    Args:
+        image_data: Raw image bytes
+        with_hash: Whether to compute the perceptual hash
+        
+    Returns:
+        Tuple of (jpeg_bytes, image_hash)
+    """
+    image, unchanged = _prepare_image(image_data)
+    image_hash = PerceptualScanCache.image_hash(image) if with_hash else None
+    
+    # Already a JPEG Gemini accepts: send the original bytes rather than
+    # decoding and re-encoding (saves the encode and a generation loss)
+    if unchanged:
+        return image_data, image_hash
+    
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=GEMINI_JPEG_QUALITY)
+    return buffer.getvalue(), image_hash
+
+
+def _is_ready_jpeg(image_data: bytes) -> bool:
+    """
+    Check from the header alone whether an image can go to Gemini as-is
+    (e.g. the route path's already-optimized <=1024px JPEG)
+    
+    Args:
+        image_data: Raw image bytes
+        
+    Returns:
+        True for a JPEG within GEMINI_MAX_IMAGE_SIZE in a mode Gemini takes
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))  # Parses the header only
+    except Exception:
+        return False
+    
+    return (
+        image.format == 'JPEG'
+        and image.mode in _GEMINI_IMAGE_MODES
+        and max(image.size) <= GEMINI_MAX_IMAGE_SIZE
+    )
+
+
+def _hash_jpeg(image_data: bytes) -> str:
+    """
+    Perceptual hash of a JPEG (runs in the image process pool)
+    pHash only needs 32x32, so decode at the smallest DCT scale
+    
+    Args:
+        image_data: JPEG bytes
+        
+    Returns:
+        Perceptual hash
+    """
+    image = Image.open(io.BytesIO(image_data))
+    image.draft('RGB', (32, 32))
+    return PerceptualScanCache.image_hash(image)
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """
+    Get the image preparation process pool (created on first use)
+    
+    Returns:
+        ProcessPoolExecutor instance
+    """
+    global _image_pool
+    
+    if _image_pool is None:
+        # spawn: forking a process that already runs threads (gRPC, logging)
+        # is not safe
+        _image_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    
+    return _image_pool
+
+
+def shutdown_image_pool():
+    """
+    Stop the image preparation workers
+    """
+    global _image_pool
+    
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
 class GeminiService:
     """
     Service class for interacting with Google Gemini AI
@@ -30,106 +455,61 @@ class GeminiService:
         try:
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
-            logger.info(f"✅ Gemini AI initialized with model: {settings. GEMINI_MODEL}")
-        except Exception as e:
-            logger. error(f"❌ Failed to initialize Gemini AI: {str(e)}")
-            raise
-    
-    def _prepare_image(self, image_data: bytes) -> Image.Image:
-        """
-        Prepare and validate image for Gemini processing
-        
-        Args:
-            image_data: Raw image bytes
             
-        Returns:
-            PIL Image object
+            # Optional cheaper first-pass model (see _generate_routed)
+            self.fast_model = (
+                genai.GenerativeModel(settings.GEMINI_FAST_MODEL)
+                if settings.GEMINI_FAST_MODEL and settings.GEMINI_FAST_MODEL != settings.GEMINI_MODEL
+                else None
+            )
+            self._identification_prompt = _PROMPT_TEMPLATE.format(
+                categories=", ".join(settings.WASTE_CATEGORIES)
+            )
             
-        Raises:
-            ValueError: If image is invalid or too large
-        """
-        try:
-            # Open image
-            image = Image.open(io.BytesIO(image_data))
+            # Constrained decoding: Gemini emits bare JSON matching the schema
+            self._identification_config = genai.types.GenerationConfig(
+                temperature=settings.GEMINI_TEMPERATURE,
+                max_output_tokens=settings.GEMINI_MAX_TOKENS,
+                response_mime_type="application/json",
+                response_schema=WASTE_RESPONSE_SCHEMA,
+            )
             
-            # Validate image
-            if image.size[0] * image.size[1] > 4096 * 4096:
-                raise ValueError("Image resolution too high (max 4096x4096)")
+            # Multi-image requests reply with one schema object per image
+            self._batch_config = genai.types.GenerationConfig(
+                temperature=settings.GEMINI_TEMPERATURE,
+                max_output_tokens=settings.GEMINI_MAX_TOKENS * settings.GEMINI_BATCH_MAX_SIZE,
+                response_mime_type="application/json",
+                response_schema=WASTE_BATCH_RESPONSE_SCHEMA,
+            )
+            self._batcher = ScanBatcher(
+                self,
+                max_size=settings.GEMINI_BATCH_MAX_SIZE,
+                window_seconds=settings.GEMINI_BATCH_WINDOW_MS / 1000
+            )
             
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Redis (optional) backs the caches shared across workers/restarts;
+            # connections are opened lazily
+            self._redis = aioredis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
             
-            # Resize if too large (optimize for API)
-            max_size = 2048
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                logger.info(f"📐 Image resized to: {new_size}")
+            # Near-duplicate result cache
+            self.scan_cache = PerceptualScanCache(self._redis) if self._redis else None
             
-            return image
+            # Educational content per category (slow-changing)
+            self._edu_cache: TTLCache = TTLCache(maxsize=64, ttl=EDU_CACHE_TTL_SECONDS)
             
+            logger.info(f"✅ Gemini AI initialized with model: {settings. GEMINI_MODEL}")
         except Exception as e:
-            logger. error(f"❌ Image preparation failed: {str(e)}")
-            raise ValueError(f"Invalid image format: {str(e)}")
+            logger. error(f"❌ Failed to initialize Gemini AI: {str(e)}")
+            raise
     
     def _create_waste_identification_prompt(self) -> str:
         """
-        Create detailed prompt for waste identification
+        Get the prompt for waste identification
         
         Returns:
-            Structured prompt string
+            Structured prompt string (built once in __init__)
         """
-        categories = ", ".join(settings.WASTE_CATEGORIES)
-        
-        prompt = f"""You are an expert waste management and recycling AI assistant.  Analyze this image and identify the waste item. 
-
-**YOUR TASK:**
-1. Identify the primary waste item in the image
-2.  Classify it into ONE of these categories: {categories}
-3. Provide disposal instructions
-4. Calculate environmental impact
-
-**RESPONSE FORMAT (JSON only):**
-{{
-    "item_name": "specific name of the item (e.g., 'Plastic Water Bottle', 'Banana Peel')",
-    "category": "one of: {categories}",
-    "confidence": 0.0-1.0 (your confidence in this classification),
-    "subcategory": "specific type (e.g., 'PET Plastic', 'Aluminum Can')",
-    "recyclable": true/false,
-    "disposal_steps": [
-        "Step 1: specific instruction",
-        "Step 2: specific instruction",
-        "Step 3: specific instruction"
-    ],
-    "bin_color": "recommended bin color (e.g., BLUE, GREEN, BLACK, RED)",
-    "environmental_impact": {{
-        "co2_saved_kg": 0.0 (if recycled properly),
-        "decomposition_time": "time to decompose if sent to landfill",
-        "recycling_potential": "can be recycled X times / not recyclable"
-    }},
-    "additional_tips": [
-        "helpful tip 1",
-        "helpful tip 2"
-    ],
-    "warnings": [
-        "any warnings or important notes"
-    ],
-    "alternatives": "suggestion for reducing this type of waste in future"
-}}
-
-**IMPORTANT RULES:**
-- Be specific: "Plastic PET bottle" not just "plastic"
-- If unsure, use category "Unknown" and confidence < 0.5
-- Always provide actionable disposal steps
-- Consider local recycling standards
-- If multiple items visible, identify the most prominent one
-- Return ONLY valid JSON, no additional text
-
-Analyze the image now:"""
-        
-        return prompt
+        return self._identification_prompt
     
     def _parse_gemini_response(self, response_text: str) -> Dict[str, Any]:
         """
@@ -142,62 +522,22 @@ Analyze the image now:"""
             Parsed and validated waste data dictionary
         """
         try:
-            # Try to extract JSON from response
-            # Sometimes Gemini adds markdown code blocks
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end]. strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end].strip()
-            
-            # Parse JSON
-            data = json. loads(response_text)
-            
-            # Validate required fields
-            required_fields = ["item_name", "category", "confidence"]
-            for field in required_fields:
-                if field not in data:
-                    raise ValueError(f"Missing required field: {field}")
-            
-            # Validate category
-            if data["category"] not in settings.WASTE_CATEGORIES:
-                logger.warning(f"⚠️ Unknown category: {data['category']}, defaulting to 'Unknown'")
-                data["category"] = "Unknown"
-            
-            # Ensure confidence is float between 0 and 1
-            data["confidence"] = max(0.0, min(1.0, float(data. get("confidence", 0.5))))
-            
-            # Add disposal guide from config if available
-            if data["category"] in WASTE_DISPOSAL_GUIDES:
-                guide = WASTE_DISPOSAL_GUIDES[data["category"]]
-                
-                # Merge with AI response (AI takes priority for disposal_steps)
-                if "disposal_steps" not in data or not data["disposal_steps"]:
-                    data["disposal_steps"] = guide["instructions"]
-                
-                if "bin_color" not in data:
-                    data["bin_color"] = guide["bin_color"]
-                
-                # Enhance environmental impact
-                if "environmental_impact" not in data:
-                    data["environmental_impact"] = {}
-                
-                data["environmental_impact"]. setdefault(
-                    "co2_saved_kg", 
-                    guide["co2_saved_per_kg"]
-                )
-                data["environmental_impact"].setdefault(
-                    "decomposition_time", 
-                    guide["decomposition_time"]
-                )
-                
-                # Add examples
-                data["examples"] = guide. get("examples", [])
+            # Structured output is normally bare JSON: parse and validate it
+            # in one native pass. Otherwise decode the first JSON object in
+            # the reply; raw_decode stops at its closing brace, so markdown
+            # fences or trailing text are ignored
+            try:
+                data = WasteResult.model_validate_json(response_text).model_dump()
+            except ValidationError as e:
+                if e.errors()[0]["type"] != "json_invalid":
+                    raise
+                json_start = response_text.find("{")
+                if json_start < 0:
+                    raise json.JSONDecodeError("No JSON object found", response_text, 0)
+                parsed, _ = _JSON_DECODER.raw_decode(response_text, json_start)
+                data = WasteResult.model_validate(parsed).model_dump()
             
-            return data
+            return self._apply_disposal_guide(data)
             
         except json.JSONDecodeError as e:
             logger.error(f"❌ JSON parsing failed: {str(e)}\nResponse: {response_text}")
@@ -207,6 +547,63 @@ Analyze the image now:"""
             logger.error(f"❌ Response parsing failed: {str(e)}")
             return self._create_fallback_response(response_text)
     
+    def _parse_waste_object(self, obj: Any) -> Dict[str, Any]:
+        """
+        Validate one already-decoded identification object (batched replies)
+        
+        Args:
+            obj: Decoded JSON value for a single image
+            
+        Returns:
+            Parsed and validated waste data dictionary (fallback on failure)
+        """
+        try:
+            data = WasteResult.model_validate(obj).model_dump()
+        except Exception as e:
+            logger.error(f"❌ Response parsing failed: {str(e)}")
+            return self._create_fallback_response(orjson.dumps(obj).decode())
+        
+        return self._apply_disposal_guide(data)
+    
+    def _apply_disposal_guide(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fill gaps in a validated result from the configured disposal guide
+        
+        Args:
+            data: Validated waste data
+            
+        Returns:
+            The same dictionary, enriched
+        """
+        # Add disposal guide from config if available
+        if data["category"] in WASTE_DISPOSAL_GUIDES:
+            guide = WASTE_DISPOSAL_GUIDES[data["category"]]
+            
+            # Merge with AI response (AI takes priority for disposal_steps)
+            if "disposal_steps" not in data or not data["disposal_steps"]:
+                data["disposal_steps"] = guide["instructions"]
+            
+            if "bin_color" not in data:
+                data["bin_color"] = guide["bin_color"]
+            
+            # Enhance environmental impact
+            if "environmental_impact" not in data:
+                data["environmental_impact"] = {}
+            
+            data["environmental_impact"]. setdefault(
+                "co2_saved_kg", 
+                guide["co2_saved_per_kg"]
+            )
+            data["environmental_impact"].setdefault(
+                "decomposition_time", 
+                guide["decomposition_time"]
+            )
+            
+            # Add examples
+            data["examples"] = guide. get("examples", [])
+        
+        return data
+    
     def _create_fallback_response(self, raw_response: str) -> Dict[str, Any]:
         """
         Create fallback response when parsing fails
@@ -218,35 +615,241 @@ Analyze the image now:"""
             Basic response dictionary
         """
         return {
-            "item_name": "Unknown Item",
-            "category": "Unknown",
-            "confidence": 0.3,
-            "subcategory": "Unidentified",
-            "recyclable": False,
-            "disposal_steps": [
-                "Unable to identify waste type clearly",
-                "Please retake photo with better lighting",
-                "Ensure the item is clearly visible",
-                "Consult local waste management guidelines"
-            ],
-            "bin_color": "GREY",
-            "environmental_impact": {
-                "co2_saved_kg": 0.0,
-                "decomposition_time": "Unknown",
-                "recycling_potential": "Unknown"
-            },
-            "additional_tips": [
-                "Try taking a clearer photo",
-                "Ensure good lighting",
-                "Focus on one item at a time"
-            ],
-            "warnings": [
-                "Could not identify waste type with high confidence"
-            ],
-            "alternatives": "Please try scanning again",
+            **_FALLBACK_TEMPLATE,
+            "environmental_impact": dict(_FALLBACK_TEMPLATE["environmental_impact"]),
             "raw_ai_response": raw_response[:500]  # Include partial response for debugging
         }
     
+    def _generation_config(self) -> "genai.types.GenerationConfig":
+        """
+        Get the generation config for waste identification
+        
+        Returns:
+            Gemini generation config (built once in __init__)
+        """
+        return self._identification_config
+    
+    async def _prepare_and_lookup(
+        self,
+        image_data: bytes
+    ) -> Tuple[Dict[str, Any], Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Prepare the image and check the perceptual cache
+        
+        Args:
+            image_data: Image file as bytes
+            
+        Returns:
+            Tuple of (image_part, image_hash, cached_result), where image_part
+            is the prepared JPEG as a Gemini blob
+        """
+        loop = asyncio.get_running_loop()
+        with_hash = self.scan_cache is not None
+        
+        if _is_ready_jpeg(image_data):
+            # Already a JPEG Gemini takes: send the bytes unchanged, no full
+            # decode; the pool is only needed for a (reduced-scale) hash
+            jpeg_bytes = image_data
+            image_hash = None
+            if with_hash:
+                image_hash = await loop.run_in_executor(get_image_pool(), _hash_jpeg, image_data)
+        else:
+            # Prepare image (CPU-bound decode/resize; off the event loop and GIL)
+            jpeg_bytes, image_hash = await loop.run_in_executor(
+                get_image_pool(), _prepare_image_payload, image_data, with_hash
+            )
+        image_part = {"mime_type": "image/jpeg", "data": jpeg_bytes}
+        logger.info(f"✅ Image prepared: {len(jpeg_bytes) // 1024}KB")
+        
+        # Short-circuit near-duplicate scans
+        cached = None
+        if image_hash:
+            cached = await self.scan_cache.get(image_hash)
+            if cached is not None:
+                cached["cache_hit"] = True
+                logger.info(f"♻️ Perceptual cache hit: {image_hash}")
+        
+        return image_part, image_hash, cached
+    
+    async def _generate(self, model: genai.GenerativeModel, prompt: str, image_part: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one identification request and parse the reply
+        
+        Args:
+            model: Gemini model to call
+            prompt: Identification prompt
+            image_part: Prepared image blob
+            
+        Returns:
+            Parsed waste data dictionary
+        """
+        response = await model.generate_content_async(
+            [prompt, image_part],
+            generation_config=self._generation_config()
+        )
+        return self._parse_gemini_response(response.text)
+    
+    @staticmethod
+    def _needs_escalation(result: Dict[str, Any]) -> bool:
+        """
+        Check whether a fast-model result should be re-run on the main model
+        
+        Args:
+            result: Parsed waste data
+            
+        Returns:
+            True if parsing fell back or confidence is low
+        """
+        return "raw_ai_response" in result or result["confidence"] < ESCALATION_CONFIDENCE
+    
+    async def _escalate(self, prompt: str, image_part: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """
+        Re-run identification on the main model (same prepared image)
+        
+        Args:
+            prompt: Identification prompt
+            image_part: Prepared image blob
+            
+        Returns:
+            Tuple of (result, model_name)
+        """
+        logger.info(f"⬆️ Escalating to {settings.GEMINI_MODEL}")
+        return await self._generate(self.model, prompt, image_part), settings.GEMINI_MODEL
+    
+    async def _generate_routed(self, prompt: str, image_part: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """
+        Try the fast model first and escalate hard cases to the main model
+        
+        Args:
+            prompt: Identification prompt
+            image_part: Prepared image blob
+            
+        Returns:
+            Tuple of (result, model_name)
+        """
+        if self.fast_model is None:
+            return await self._generate(self.model, prompt, image_part), settings.GEMINI_MODEL
+        
+        try:
+            result = await self._generate(self.fast_model, prompt, image_part)
+        except Exception as e:
+            logger.warning(f"⚠️ Fast model failed: {str(e)}")
+            return await self._escalate(prompt, image_part)
+        
+        if self._needs_escalation(result):
+            return await self._escalate(prompt, image_part)
+        
+        return result, settings.GEMINI_FAST_MODEL
+    
+    async def _generate_batch(self, image_parts: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+        """
+        Identify several images with one Gemini request
+        
+        Items that need escalation are re-run individually on the main model.
+        If the reply can't be matched to the images (wrong length, or
+        image_index values that aren't exactly one per image), every image
+        is retried on its own.
+        
+        Args:
+            image_parts: Prepared image blobs
+            
+        Returns:
+            List of (result, model_name), in input order
+        """
+        prompt = self._create_waste_identification_prompt()
+        model = self.fast_model or self.model
+        model_used = settings.GEMINI_FAST_MODEL if self.fast_model else settings.GEMINI_MODEL
+        
+        contents = [_BATCH_PROMPT_PREFIX.format(count=len(image_parts)) + prompt]
+        for index, image_part in enumerate(image_parts):
+            contents += [f"Image {index}", image_part]
+        
+        try:
+            response = await model.generate_content_async(contents, generation_config=self._batch_config)
+            items = orjson.loads(response.text)
+            if not isinstance(items, list) or len(items) != len(image_parts):
+                raise ValueError(f"expected {len(image_parts)} results, got {len(items) if isinstance(items, list) else 'non-list'}")
+            
+            # Place each object by its image_index; any missing, duplicate
+            # or out-of-range index rejects the whole reply
+            by_index = {item.get("image_index"): item for item in items if isinstance(item, dict)}
+            if set(by_index) != set(range(len(image_parts))):
+                raise ValueError("image_index values don't match the images")
+            items = [by_index[index] for index in range(len(image_parts))]
+        except Exception as e:
+            logger.warning(f"⚠️ Batched identification failed, retrying individually: {str(e)}")
+            return list(await asyncio.gather(*(
+                self._generate_routed(prompt, image_part) for image_part in image_parts
+            )))
+        
+        async def finish(item: Dict[str, Any], image_part: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+            item.pop("image_index", None)
+            result = self._parse_waste_object(item)
+            if self._needs_escalation(result) and (self.fast_model or "raw_ai_response" in result):
+                return await self._escalate(prompt, image_part)
+            return result, model_used
+        
+        return list(await asyncio.gather(*(
+            finish(item, image_part) for item, image_part in zip(items, image_parts)
+        )))
+    
+    async def _finalize_result(
+        self,
+        result: Dict[str, Any],
+        model_used: str,
+        image_hash: Optional[str],
+        start_time: float
+    ) -> Dict[str, Any]:
+        """
+        Add metadata and points to a parsed result and cache it
+        
+        Args:
+            result: Parsed Gemini response
+            model_used: Name of the model that produced the result
+            image_hash: Perceptual hash (None when caching is disabled)
+            start_time: time.perf_counter() reading when identification started
+            
+        Returns:
+            Completed result dictionary
+        """
+        # Add metadata
+        result["processing_time_seconds"] = round(time.perf_counter() - start_time, 3)
+        result["model_used"] = model_used
+        result["timestamp"] = time.time()
+        
+        # Calculate points earned
+        result["points_earned"] = self._calculate_points(result)
+        
+        # Never cache the fallback response
+        if image_hash and "raw_ai_response" not in result:
+            await self.scan_cache.set(image_hash, result)
+        
+        logger.info(f"✅ Identification complete: {result['item_name']} ({result['confidence']:.2%} confidence)")
+        
+        return result
+    
+    @staticmethod
+    def _error_response(error: Exception, start_time: float) -> Dict[str, Any]:
+        """
+        Build the result returned when identification fails
+        
+        Args:
+            error: Raised exception
+            start_time: time.perf_counter() reading when identification started
+            
+        Returns:
+            Error result dictionary
+        """
+        logger.error(f"❌ Waste identification failed: {str(error)}")
+        return {
+            "error": True,
+            "error_message": str(error),
+            "item_name": "Error",
+            "category": "Unknown",
+            "confidence": 0.0,
+            "processing_time_seconds": round(time.perf_counter() - start_time, 3)
+        }
+    
     async def identify_waste(
         self, 
         image_data: bytes,
@@ -269,53 +872,93 @@ Analyze the image now:"""
             >>> print(result["item_name"])
             "Plastic Water Bottle"
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             logger.info("🔍 Starting waste identification...")
             
-            # Prepare image
-            image = self._prepare_image(image_data)
-            logger.info(f"✅ Image prepared: {image.size}")
-            
-            # Create prompt
-            prompt = self._create_waste_identification_prompt()
+            image_part, image_hash, cached = await self._prepare_and_lookup(image_data)
+            if cached is not None:
+                cached["processing_time_seconds"] = round(time.perf_counter() - start_time, 3)
+                return cached
             
-            # Generate response from Gemini
+            # Generate and parse response from Gemini (may be batched with
+            # concurrent scans)
             logger.info("🤖 Sending request to Gemini AI...")
-            response = self.model.generate_content(
-                [prompt, image],
-                generation_config=genai.types.GenerationConfig(
-                    temperature=settings.GEMINI_TEMPERATURE,
-                    max_output_tokens=settings.GEMINI_MAX_TOKENS,
-                )
-            )
+            result, model_used = await self._batcher.submit(image_part)
+            
+            return await self._finalize_result(result, model_used, image_hash, start_time)
+            
+        except Exception as e:
+            return self._error_response(e, start_time)
+    
+    async def identify_waste_stream(self, image_data: bytes) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of identify_waste
+        
+        Gemini's reply is consumed chunk by chunk so the item name and category
+        can be sent to the client as soon as they have been generated, long
+        before the disposal steps and impact fields are finished.
+        
+        Args:
+            image_data: Image file as bytes
+            
+        Yields:
+            Events of the form {"event": name, "data": payload}:
+            - "partial": {"item_name", "category"} as soon as both are known
+            - "result": the complete result (same shape as identify_waste)
+            - "error": the error result if identification failed
+        
+        Example:
+            >>> async for event in service.identify_waste_stream(image_bytes):
+            ...     print(event["event"], event["data"])
+        """
+        start_time = time.perf_counter()
+        
+        try:
+            logger.info("🔍 Starting streaming waste identification...")
             
-            # Parse response
-            result = self._parse_gemini_response(response.text)
+            image_part, image_hash, cached = await self._prepare_and_lookup(image_data)
+            if cached is not None:
+                cached["processing_time_seconds"] = round(time.perf_counter() - start_time, 3)
+                yield {"event": "result", "data": cached}
+                return
             
-            # Add metadata
-            result["processing_time_seconds"] = round(time.time() - start_time, 2)
-            result["model_used"] = settings.GEMINI_MODEL
-            result["timestamp"] = time.time()
+            prompt = self._create_waste_identification_prompt()
             
-            # Calculate points earned
-            result["points_earned"] = self._calculate_points(result)
+            # Stream from the fast model when routing is enabled
+            model = self.fast_model or self.model
+            model_used = settings.GEMINI_FAST_MODEL if self.fast_model else settings.GEMINI_MODEL
             
-            logger.info(f"✅ Identification complete: {result['item_name']} ({result['confidence']:.2%} confidence)")
+            logger.info("🤖 Streaming request to Gemini AI...")
+            response = await model.generate_content_async(
+                [prompt, image_part],
+                generation_config=self._generation_config(),
+                stream=True
+            )
             
-            return result
+            response_text = ""
+            partial_sent = False
+            async for chunk in response:
+                response_text += _chunk_text(chunk)
+                
+                if not partial_sent:
+                    fields = {
+                        key: orjson.loads(f'"{value}"')
+                        for key, value in _PARTIAL_FIELD_PATTERN.findall(response_text)
+                    }
+                    if len(fields) == len(_PARTIAL_FIELDS):
+                        partial_sent = True
+                        yield {"event": "partial", "data": fields}
+            
+            result = self._parse_gemini_response(response_text)
+            if self.fast_model and self._needs_escalation(result):
+                result, model_used = await self._escalate(prompt, image_part)
+            
+            yield {"event": "result", "data": await self._finalize_result(result, model_used, image_hash, start_time)}
             
         except Exception as e:
-            logger.error(f"❌ Waste identification failed: {str(e)}")
-            return {
-                "error": True,
-                "error_message": str(e),
-                "item_name": "Error",
-                "category": "Unknown",
-                "confidence": 0.0,
-                "processing_time_seconds": round(time.time() - start_time, 2)
-            }
+            yield {"event": "error", "data": self._error_response(e, start_time)}
     
     def _calculate_points(self, waste_data: Dict[str, Any]) -> int:
         """
@@ -327,21 +970,15 @@ Analyze the image now:"""
         Returns:
             Points earned (integer)
         """
-        base_points = settings.POINTS_CORRECT_DISPOSAL
-        
-        # Bonus for high confidence
-        if waste_data. get("confidence", 0) >= 0.9:
-            base_points += 10
-        
-        # Bonus for recyclable items
-        if waste_data.get("recyclable", False):
-            base_points += 20
-        
-        # Bonus for difficult categories (hazardous, e-waste)
-        if waste_data.get("category") in ["Hazardous Waste", "E-Waste"]:
-            base_points += 30
-        
-        return base_points
+        return (
+            settings.POINTS_CORRECT_DISPOSAL
+            # Bonus for high confidence
+            + 10 * (waste_data.get("confidence", 0) >= 0.9)
+            # Bonus for recyclable items
+            + 20 * bool(waste_data.get("recyclable", False))
+            # Bonus for difficult categories (hazardous, e-waste)
+            + 30 * (waste_data.get("category") in _BONUS_CATEGORIES)
+        )
     
     async def get_educational_content(self, category: str) -> Dict[str, Any]:
         """
@@ -356,6 +993,22 @@ Analyze the image now:"""
         if category not in WASTE_DISPOSAL_GUIDES:
             return {"error": "Category not found"}
         
+        # In-process cache, then Redis (survives restarts)
+        cached = self._edu_cache.get(category)
+        if cached is not None:
+            return cached
+        
+        redis_key = f"educontent:{category}"
+        if self._redis:
+            try:
+                raw = await self._redis.get(redis_key)
+                if raw is not None:
+                    content = orjson.loads(raw)
+                    self._edu_cache[category] = content
+                    return content
+            except Exception as e:
+                logger.warning(f"⚠️ Educational content cache lookup failed: {str(e)}")
+        
         guide = WASTE_DISPOSAL_GUIDES[category]
         
         # Generate additional AI insights
@@ -368,19 +1021,29 @@ Format as JSON:
 }}"""
         
         try:
-            response = self.model.generate_content(prompt)
-            ai_content = json.loads(response.text. replace("```json", ""). replace("```", ""). strip())
-            
-            return {
-                **guide,
-                **ai_content,
-                "category": category
-            }
+            response = await self.model.generate_content_async(prompt)
+            ai_content = orjson.loads(response.text. replace("```json", ""). replace("```", ""). strip())
         except:
+            # Not cached, so a failed Gemini call is retried next time
             return {
                 **guide,
                 "category": category
             }
+        
+        content = {
+            **guide,
+            **ai_content,
+            "category": category
+        }
+        
+        self._edu_cache[category] = content
+        if self._redis:
+            try:
+                await self._redis.setex(redis_key, EDU_CACHE_TTL_SECONDS, orjson.dumps(content))
+            except Exception as e:
+                logger.warning(f"⚠️ Educational content cache write failed: {str(e)}")
+        
+        return content
     
     def validate_api_key(self) -> bool:
         """
@@ -396,10 +1059,127 @@ Format as JSON:
         except Exception as e:
             logger.error(f"❌ API key validation failed: {str(e)}")
             return False
+    
+    async def validate_api_key_async(self) -> bool:
+        """
+        Validate the API key over the asyncio client
+        
+        Scans use the asyncio gRPC channel, which is separate from the one
+        behind validate_api_key; calling this at startup opens (and keeps
+        alive) the connection real requests will reuse.
+        
+        Returns:
+            True if API key is valid, False otherwise
+        """
+        try:
+            model = self.fast_model or self.model
+            response = await model.generate_content_async("Say 'OK' if you can hear me")
+            return bool(response.text)
+        except Exception as e:
+            logger.error(f"❌ API key validation failed: {str(e)}")
+            return False
+
+
+# ==================== MICRO-BATCHING ====================
+
+class ScanBatcher:
+    """
+    Coalesces identification requests that arrive within a short window
+    into a single multi-image Gemini call
+    
+    Bursty traffic (e.g. a classroom scanning at once) then costs one
+    round-trip per batch instead of one per image, for at most
+    window_seconds of added latency. A scan that arrives while no other
+    batch is in flight is sent immediately.
+    """
+    
+    def __init__(self, service: GeminiService, max_size: int, window_seconds: float):
+        """
+        Args:
+            service: Owning Gemini service
+            max_size: Maximum images per request (1 disables batching)
+            window_seconds: How long to wait for more requests
+        """
+        self._service = service
+        self._max_size = max_size
+        self._window = window_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._dispatches: set = set()  # Strong refs to in-flight batches
+    
+    async def submit(self, image_part: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """
+        Identify one image, possibly as part of a batch
+        
+        Args:
+            image_part: Prepared image blob
+            
+        Returns:
+            Tuple of (result, model_name)
+        """
+        if self._max_size <= 1:
+            prompt = self._service._create_waste_identification_prompt()
+            return await self._service._generate_routed(prompt, image_part)
+        
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_part, future))
+        return await future
+    
+    async def _collect(self):
+        """Group queued requests into batches and dispatch them"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await self._queue.get()]
+            
+            # Take whatever is already queued
+            while len(batch) < self._max_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            # Only wait for more when there is concurrent load; an idle
+            # service sends a lone scan straight away
+            deadline = loop.time() + self._window if self._dispatches else loop.time()
+            
+            while len(batch) < self._max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Don't hold up the next batch while this one is in flight
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        """Run one batch and resolve its callers' futures"""
+        try:
+            if len(batch) == 1:
+                prompt = self._service._create_waste_identification_prompt()
+                results = [await self._service._generate_routed(prompt, batch[0][0])]
+            else:
+                logger.info(f"📦 Identifying batch of {len(batch)} images")
+                results = await self._service._generate_batch([image_part for image_part, _ in batch])
+            
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
 
 
 # ==================== SINGLETON INSTANCE ====================
 _gemini_service_instance: Optional[GeminiService] = None
+_gemini_service_lock = threading.Lock()
 
 
 def get_gemini_service() -> GeminiService:
@@ -415,8 +1195,11 @@ def get_gemini_service() -> GeminiService:
     """
     global _gemini_service_instance
     
+    # Double-checked so concurrent first calls build only one service
     if _gemini_service_instance is None:
-        _gemini_service_instance = GeminiService()
+        with _gemini_service_lock:
+            if _gemini_service_instance is None:
+                _gemini_service_instance = GeminiService()
     
     return _gemini_service_instance
 